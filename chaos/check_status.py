@@ -1,24 +1,77 @@
 import argparse
-import subprocess
-from kubernetes import client, config
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Callable, Optional
+from kubernetes import client, config, watch
 import time
 
 from kubernetes.client import CoreV1Api
+from kubernetes.client.rest import ApiException
+from kubernetes.stream import stream
+from kubernetes.stream.ws_client import ERROR_CHANNEL
 
-from chaos import failures
+log = logging.getLogger(__name__)
 
+KUBECONFIG_PATH = "/etc/rancher/k3s/k3s.yaml"
 START_TIMEOUT = 300
 START_CHECK_INTERVAL = 10
 TIMEOUT = 10
 INTERVAL = 2
+# Upper bound on concurrent per-pod exec probes within one polling cycle
+MAX_PROBE_WORKERS = 32
+# Scratch file for the disk write probe, and the write bandwidth (KiB/s) column of fio's terse output
+DISK_PROBE_FILE = "/var/log/mysql/test-disk-write.tmp"
+FIO_TERSE_WRITE_BW_FIELD = 47
+# Pod lists are reused for this many seconds (matches INTERVAL)
+POD_LIST_TTL = INTERVAL
+
+# (namespace, label_selector) -> (fetched_at, pods)
+_pod_list_cache = {}
+
+# Shared CoreV1Api, created lazily by get_core_api()
+_core_api: Optional[CoreV1Api] = None
+_api_lock = threading.Lock()
+
+# Containers whose name contains one of these tokens are helpers and are ignored by usage checks
+_SIDECAR_TOKENS = ("sidecar", "busybox")
+
+# Quantity suffix -> multiplier for CPU (to millicores) and memory (to bytes)
+_CPU_UNITS = {"n": 1e-6, "u": 1e-3}
+_MEM_UNITS = {
+    "Ki": 1024, "Mi": 1024 ** 2, "Gi": 1024 ** 3, "Ti": 1024 ** 4, "Pi": 1024 ** 5, "Ei": 1024 ** 6,
+    "k": 1000, "K": 1000, "M": 1000 ** 2, "G": 1000 ** 3, "T": 1000 ** 4, "P": 1000 ** 5, "E": 1000 ** 6,
+    "": 1
+}
+_MEM_RE = re.compile(r"^([0-9.]+)([kKMGTPE]i?)?$")
+
+# dd summary line: "10485760 bytes (10 MB, 10 MiB) copied, 0.0123 s, 852 MB/s" (busybox: "... 0.01 seconds, ...")
+_DD_RE = re.compile(r"copied, ([\d.]+) s")
+
+# ping summary lines: "3 packets transmitted, 3 received, 0% packet loss" / "rtt min/avg/max/mdev = 1.0/2.0/3.0/0.5 ms"
+_LOSS_RE = re.compile(r"(\d+(?:\.\d+)?)% packet loss")
+_RTT_RE = re.compile(r"(?:rtt|round-trip) [^=]*=\s*[\d.]+/([\d.]+)/")
 
 
 def get_pod_list(api, namespace, label_selector):
-    """Retrieve a list of Pods in the specified namespace matching the given label selector."""
+    """
+    Retrieve a list of Pods in the specified namespace matching the given label selector.
+    Results are reused for POD_LIST_TTL seconds so back-to-back polls share one API call.
+    """
+    key = (namespace, label_selector)
+    cached = _pod_list_cache.get(key)
+    if cached is not None and time.time() - cached[0] < POD_LIST_TTL:
+        return cached[1]
     try:
         ret = api.list_namespaced_pod(namespace, label_selector=label_selector)
+        _pod_list_cache[key] = (time.time(), ret.items)
         return ret.items
     except Exception as e:
+        _pod_list_cache.pop(key, None)
         print(f"❌ Failed to retrieve Pod list: {e}")
         return []
 
@@ -48,24 +101,100 @@ def check_pod_running_and_ready(pod):
 
 
 def parse_cpu_to_millicores(cpu_str: str) -> int:
-    """Convert CPU string like '50m' or '0.1' to millicores"""
-    if cpu_str.endswith("m"):
+    """Convert CPU string like '50m', '0.1' or '12345678n' to millicores"""
+    suffix = cpu_str[-1]
+    if suffix == "m":
         return int(cpu_str[:-1])
-    else:
-        return int(float(cpu_str) * 1000)
+    scale = _CPU_UNITS.get(suffix)
+    if scale is not None:
+        return int(float(cpu_str[:-1]) * scale)
+    # Round rather than truncate: float("0.58") * 1000 == 579.999...
+    return int(round(float(cpu_str) * 1000))
+
+
+def _wait_until_all_ready(api, namespace, label_selector, timeout: float = START_TIMEOUT,
+                          expected_count: int = 1) -> bool:
+    """
+    Block until at least expected_count Pods match the selector and all of them are Running & Ready,
+    or the timeout expires.
+    Pods are listed once, then a watch delivers only the changes instead of re-listing
+    every START_CHECK_INTERVAL. When listing or the
+    watch fails, retries back off exponentially up to START_CHECK_INTERVAL.
+    """
+    deadline = time.time() + timeout
+    attempt = 0
+
+    def backoff():
+        nonlocal attempt
+        time.sleep(min(START_CHECK_INTERVAL, 0.5 * 2 ** attempt, max(0, deadline - time.time())))
+        attempt += 1
 
+    while time.time() < deadline:
+        try:
+            pods = api.list_namespaced_pod(namespace, label_selector=label_selector).items
+        except Exception as e:
+            print(f"❌ Failed to retrieve Pod list: {e}")
+            backoff()
+            continue
+
+        ready = {p.metadata.name: check_pod_running_and_ready(p) for p in pods}
 
-def get_container_cpu_limit_millicores(pod, container_name: str):
-    """Get the CPU limit (millicores) for a given container in a Pod"""
-    for c in pod.spec.containers:
-        if c.name == container_name and c.resources and c.resources.limits:
-            cpu_limit = c.resources.limits.get("cpu")
-            if not cpu_limit:
-                return None
-            if cpu_limit.endswith("m"):
-                return int(cpu_limit[:-1])
-            return int(float(cpu_limit) * 1000)
-    return None
+        def all_ready():
+            return len(ready) >= max(expected_count, 1) and all(ready.values())
+
+        if all_ready():
+            return True
+        if not ready:
+            print("⚠️ No target Pods found, waiting...")
+        else:
+            not_ready = [name for name, ok in ready.items() if not ok]
+            print(f"⏳ Pods not yet Running/Ready: {', '.join(not_ready)}; watching for changes...")
+
+        w = watch.Watch()
+        try:
+            for event in w.stream(
+                    api.list_namespaced_pod,
+                    namespace,
+                    label_selector=label_selector,
+                    timeout_seconds=max(1, int(deadline - time.time()))
+            ):
+                pod = event["object"]
+                if event["type"] == "DELETED":
+                    ready.pop(pod.metadata.name, None)
+                else:
+                    ready[pod.metadata.name] = check_pod_running_and_ready(pod)
+                if all_ready():
+                    w.stop()
+                    return True
+        except Exception as e:
+            print(f"⚠️ Pod watch interrupted: {e}")
+        backoff()
+
+    print("❌ Timeout: Pods did not all become Running/Ready within the allowed time.")
+    return False
+
+
+@lru_cache(maxsize=256)
+def _is_sidecar(container_name: str) -> bool:
+    """Whether a container is an injected helper (e.g., sidecar-busybox) rather than the main workload."""
+    name = container_name.lower()
+    return any(token in name for token in _SIDECAR_TOKENS)
+
+
+def _over_threshold(samples, ratio_threshold: float) -> list:
+    """
+    Return the (pod, container, usage, limit) samples whose usage/limit ratio reaches the threshold.
+    Compares usage against threshold * limit in a single pass, without per-sample division or output.
+    """
+    return [sample for sample in samples if sample[2] >= ratio_threshold * sample[3]]
+
+
+def _pause(stop_event: Optional[threading.Event]) -> bool:
+    """Sleep one polling INTERVAL; return True if stop_event was set (the caller should give up)."""
+    if stop_event is None:
+        time.sleep(INTERVAL)
+        return False
+    return stop_event.wait(INTERVAL)
 
 
 def check_cpu_stress_recovered(
@@ -73,89 +202,78 @@ def check_cpu_stress_recovered(
         namespace: str,
         label_selector: str,
         timeout: int = 300,
-        cpu_usage_ratio_threshold: float = 0.5  # e.g., 50%
+        cpu_usage_ratio_threshold: float = 0.5,  # e.g., 50%
+        stop_event: Optional[threading.Event] = None,
+        ready_timeout: float = START_TIMEOUT
 ):
     """
     Check if CPU stress has recovered by ensuring all main containers
     have CPU usage below the given threshold relative to their limit.
+    Returns False early once stop_event is set.
     """
     print(f"🔍 Checking whether CPU stress has recovered "
           f"(usage ratio below {cpu_usage_ratio_threshold * 100:.0f}% for each container)...")
 
     # Wait until all pods become Running & Ready
-    start_time = time.time()
-    while time.time() - start_time < START_TIMEOUT:
-        pods = get_pod_list(api, namespace, label_selector)
-        if not pods:
-            print("⚠️ No target pods found, waiting...")
-            time.sleep(START_CHECK_INTERVAL)
-            continue
-
-        all_ready = all(check_pod_running_and_ready(pod) for pod in pods)
-        if not all_ready:
-            print("⏳ Some pods are not yet Running/Ready, waiting...")
-            time.sleep(START_CHECK_INTERVAL)
-            continue
-        break
+    if not _wait_until_all_ready(api, namespace, label_selector, ready_timeout):
+        return False
 
     start_time = time.time()
     while time.time() - start_time < timeout:
         try:
-            # Fetch per-container CPU usage
-            cmd = ["kubectl", "top", "pod", "-n", namespace, "--selector", label_selector, "--containers"]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-
-            if result.returncode != 0:
-                print(f"⚠️ Failed to execute kubectl top: {result.stderr.strip()}")
-                time.sleep(INTERVAL)
-                continue
+            # Index pods and their CPU limits once per cycle for O(1) lookup per metrics row
+            pods = get_pod_list(api, namespace, label_selector)
+            pods_by_name = {p.metadata.name: p for p in pods}
+            cpu_limits = {
+                (p.metadata.name, container_name): limits[0]
+                for p in pods
+                for container_name, limits in get_container_limits(p).items()
+            }
 
-            lines = result.stdout.strip().split('\n')
-            if len(lines) < 2:
+            # Fetch per-container CPU usage
+            usage = _fetch_container_usage(api, namespace, label_selector)
+            if not usage:
                 print("⚠️ No metrics data available yet, waiting...")
-                time.sleep(INTERVAL)
+                if _pause(stop_event):
+                    return False
                 continue
 
-            all_cpu_normal = True
-
-            for line in lines[1:]:
-                parts = line.split()
-                if len(parts) < 3:
-                    continue
-                pod_name, container_name, cpu_str = parts[0], parts[1], parts[2]
-
-                if "sidecar" in container_name or "busybox" in container_name:
+            # Collect (pod, container, usage, limit) samples, then evaluate them in one pass
+            samples = []
+            for (pod_name, container_name), (current_cpu_m, _) in usage.items():
+                if _is_sidecar(container_name):
                     continue  # skip sidecar
 
-                # Find the corresponding pod object
-                pod = next((p for p in pods if p.metadata.name == pod_name), None)
-                if not pod:
+                if pod_name not in pods_by_name:
                     continue
 
-                current_cpu_m = parse_cpu_to_millicores(cpu_str)
-                limit_cpu_m = get_container_cpu_limit_millicores(pod, container_name)
+                limit_cpu_m = cpu_limits.get((pod_name, container_name))
 
                 if not limit_cpu_m or limit_cpu_m == 0:
-                    print(f"⚠️ {pod_name}/{container_name}: No CPU limit set (usage: {current_cpu_m}m)")
+                    log.debug("%s/%s: no CPU limit set (usage: %dm)", pod_name, container_name, current_cpu_m)
                     continue
 
-                usage_ratio = current_cpu_m / limit_cpu_m
-                print(f"📊 {pod_name}/{container_name}: {current_cpu_m}m / {limit_cpu_m}m = {usage_ratio:.1%}")
+                samples.append((pod_name, container_name, current_cpu_m, limit_cpu_m))
 
-                if usage_ratio >= cpu_usage_ratio_threshold:
-                    print(f"⚠️ High CPU usage detected in {pod_name}/{container_name}: "
-                          f"{usage_ratio:.1%} ≥ {cpu_usage_ratio_threshold:.0%}")
-                    all_cpu_normal = False
+            offenders = _over_threshold(samples, cpu_usage_ratio_threshold)
+            for pod_name, container_name, current_cpu_m, limit_cpu_m in offenders:
+                print(f"⚠️ High CPU usage detected in {pod_name}/{container_name}: "
+                      f"{current_cpu_m}m / {limit_cpu_m}m = {current_cpu_m / limit_cpu_m:.1%} "
+                      f"≥ {cpu_usage_ratio_threshold:.0%}")
 
-            if all_cpu_normal:
-                print("✅ CPU stress recovered: all containers are within safe usage range.")
+            if not offenders:
+                print(f"✅ CPU stress recovered: {len(samples)} containers under "
+                      f"{cpu_usage_ratio_threshold:.0%} of their limit.")
                 return True
 
         except Exception as e:
             print(f"⚠️ Error while checking CPU usage: {e}")
 
+        if stop_event is not None and stop_event.is_set():
+            return False
         print("⏳ Still above threshold or metrics unavailable, retrying...")
-        time.sleep(INTERVAL)
+        if _pause(stop_event):
+            return False
 
     print("❌ Timeout: CPU usage did not recover within expected time.")
     return False
@@ -163,62 +281,61 @@ def check_cpu_stress_recovered(
 
 def parse_memory_to_bytes(mem_str: str) -> int:
     """Convert kubectl top memory output (e.g., '120Mi', '1.5Gi') into bytes."""
-    mem_str = mem_str.strip()
-    if mem_str.endswith('Ki'):
-        return int(float(mem_str[:-2]) * 1024)
-    elif mem_str.endswith('Mi'):
-        return int(float(mem_str[:-2]) * 1024 ** 2)
-    elif mem_str.endswith('Gi'):
-        return int(float(mem_str[:-2]) * 1024 ** 3)
-    elif mem_str.endswith('Ti'):
-        return int(float(mem_str[:-2]) * 1024 ** 4)
-    elif mem_str.endswith('Pi'):
-        return int(float(mem_str[:-2]) * 1024 ** 5)
-    elif mem_str.endswith('Ei'):
-        return int(float(mem_str[:-2]) * 1024 ** 6)
-    elif mem_str.endswith('K'):
-        return int(float(mem_str[:-1]) * 1000)
-    elif mem_str.endswith('M'):
-        return int(float(mem_str[:-1]) * 1000 ** 2)
-    elif mem_str.endswith('G'):
-        return int(float(mem_str[:-1]) * 1000 ** 3)
-    elif mem_str.endswith('T'):
-        return int(float(mem_str[:-1]) * 1000 ** 4)
-    else:
-        return int(mem_str)
-
-
-def get_container_memory_limit_bytes(container) -> int | None:
-    """Return memory limit (bytes) for a given container, or None if not defined."""
-    if not container.resources or not container.resources.limits:
-        return None
-    mem_limit = container.resources.limits.get('memory')
-    if not mem_limit:
-        return None
-    return parse_memory_to_bytes(mem_limit) if isinstance(mem_limit, str) else int(mem_limit)
+    match = _MEM_RE.match(mem_str.strip())
+    if not match:
+        raise ValueError(f"Invalid memory quantity: {mem_str!r}")
+    return int(float(match.group(1)) * _MEM_UNITS[match.group(2) or ""])
 
 
-def get_container_memory_usage_bytes(namespace: str, pod_name: str, container_name: str) -> int | None:
-    """Fetch memory usage (bytes) for a specific container via 'kubectl top pod <pod> --containers'."""
+@lru_cache(maxsize=1024)
+def _limits_for(pod_uid: str, containers: tuple) -> dict[str, tuple[int | None, int | None]]:
+    """
+    Resolve (cpu_millicores, memory_bytes) limits per container name.
+    Memoized on the pod uid and its frozen container limits, since specs do not change while polling.
+    """
+    limits = {}
+    for name, container_limits in containers:
+        container_limits = dict(container_limits)
+        cpu_limit = container_limits.get("cpu")
+        mem_limit = container_limits.get("memory")
+        limits[name] = (
+            parse_cpu_to_millicores(cpu_limit) if cpu_limit else None,
+            parse_memory_to_bytes(str(mem_limit)) if mem_limit else None,
+        )
+    return limits
+
+
+def get_container_limits(pod) -> dict[str, tuple[int | None, int | None]]:
+    """Return {container_name: (cpu_millicores, memory_bytes)} limits for a Pod, None where undefined."""
+    containers = tuple(
+        (c.name, tuple(sorted(((c.resources.limits if c.resources else None) or {}).items())))
+        for c in pod.spec.containers
+    )
+    return _limits_for(pod.metadata.uid, containers)
+
+
+def _fetch_container_usage(api, namespace: str, label_selector: str) -> dict[tuple[str, str], tuple[int, int]]:
+    """
+    Fetch (cpu_millicores, memory_bytes) usage for every container matching the selector with a single
+    metrics.k8s.io query, keyed by (pod_name, container_name). Returns an empty dict if metrics are unavailable.
+    """
+    usage = {}
     try:
-        cmd = ["kubectl", "top", "pod", pod_name, "-n", namespace, "--containers"]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        if result.returncode != 0:
-            print(f"⚠️ Failed to get memory usage for {pod_name}/{container_name}: {result.stderr.strip()}")
-            return None
-
-        lines = result.stdout.strip().split('\n')
-        for line in lines[1:]:
-            parts = line.split()
-            if len(parts) < 4:
-                continue
-            cname, cpu_str, mem_str = parts[1], parts[2], parts[3]
-            if cname == container_name:
-                return parse_memory_to_bytes(mem_str)
-        return None
+        metrics_api = client.CustomObjectsApi(api.api_client)
+        ret = metrics_api.list_namespaced_custom_object(
+            "metrics.k8s.io", "v1beta1", namespace, "pods", label_selector=label_selector
+        )
+        for item in ret.get("items", []):
+            pod_name = item["metadata"]["name"]
+            for container in item.get("containers", []):
+                container_usage = container.get("usage", {})
+                usage[(pod_name, container["name"])] = (
+                    parse_cpu_to_millicores(container_usage.get("cpu", "0")),
+                    parse_memory_to_bytes(container_usage.get("memory", "0")),
+                )
     except Exception as e:
-        print(f"⚠️ Error getting container memory: {e}")
-        return None
+        print(f"⚠️ Failed to query metrics API for {label_selector}: {e}")
+    return usage
 
 
 def check_memory_stress_recovered(
@@ -226,26 +343,20 @@ def check_memory_stress_recovered(
         namespace: str,
         label_selector: str,
         timeout: int = TIMEOUT,
-        memory_usage_ratio_threshold: float = 0.5  # 50%
+        memory_usage_ratio_threshold: float = 0.5,  # 50%
+        stop_event: Optional[threading.Event] = None,
+        ready_timeout: float = START_TIMEOUT
 ):
     """
     Check whether memory stress has recovered by comparing usage vs. limits
     for each non-sidecar container in all selected pods.
+    Returns False early once stop_event is set.
     """
     print(f"🔍 Checking memory recovery (threshold: {memory_usage_ratio_threshold * 100:.0f}%)...")
 
     # Wait for pods to be ready
-    start_time = time.time()
-    while time.time() - start_time < START_TIMEOUT:
-        pods = get_pod_list(api, namespace, label_selector)
-        if not pods:
-            print("⚠️ No target pods found, waiting...")
-            time.sleep(START_CHECK_INTERVAL)
-            continue
-        if all(check_pod_running_and_ready(p) for p in pods):
-            break
-        print("⏳ Waiting for pods to be Running/Ready...")
-        time.sleep(START_CHECK_INTERVAL)
+    if not _wait_until_all_ready(api, namespace, label_selector, ready_timeout):
+        return False
 
     # Begin monitoring memory recovery
     start_time = time.time()
@@ -255,104 +366,79 @@ def check_memory_stress_recovered(
         pods = get_pod_list(api, namespace, label_selector)
         if not pods:
             print("⚠️ No pods found, skipping check cycle.")
-            time.sleep(INTERVAL)
+            if _pause(stop_event):
+                return False
             continue
 
+        # One metrics call per cycle for all selected pods
+        usage = _fetch_container_usage(api, namespace, label_selector)
+
+        # Collect (pod, container, usage, limit) samples, then evaluate them in one pass
+        samples = []
         for pod in pods:
             pod_name = pod.metadata.name
             try:
-                pod_obj = api.read_namespaced_pod(name=pod_name, namespace=namespace)
-                containers = [
-                    c for c in pod_obj.spec.containers
-                    if "busybox" not in c.name.lower() and "sidecar" not in c.name.lower()
-                ]
+                containers = [c for c in pod.spec.containers if not _is_sidecar(c.name)]
                 if not containers:
-                    print(f"⚠️ Pod {pod_name} has no valid containers, skipping.")
+                    log.debug("Pod %s has no valid containers, skipping", pod_name)
                     continue
 
-                pod_normal = True
+                pod_limits = get_container_limits(pod)
                 for container in containers:
-                    limit_bytes = get_container_memory_limit_bytes(container)
+                    limit_bytes = pod_limits[container.name][1]
                     if not limit_bytes:
-                        print(f"⚠️ {pod_name}/{container.name} has no memory limit, skipping.")
+                        log.debug("%s/%s has no memory limit, skipping", pod_name, container.name)
                         continue
 
-                    usage_bytes = get_container_memory_usage_bytes(namespace, pod_name, container.name)
-                    if usage_bytes is None:
+                    if (pod_name, container.name) not in usage:
                         print(f"⚠️ Failed to get usage for {pod_name}/{container.name}.")
-                        pod_normal = False
+                        all_pods_normal = False
                         continue
 
-                    usage_ratio = usage_bytes / limit_bytes
-                    print(f"📊 {pod_name}/{container.name}: {usage_bytes / (1024 ** 2):.1f}MB / "
-                          f"{limit_bytes / (1024 ** 2):.1f}MB = {usage_ratio:.1%}")
-
-                    if usage_ratio >= memory_usage_ratio_threshold:
-                        print(f"⚠️ High usage: {usage_ratio:.1%} ≥ {memory_usage_ratio_threshold:.0%}")
-                        pod_normal = False
-
-                if not pod_normal:
-                    all_pods_normal = False
+                    samples.append((pod_name, container.name, usage[(pod_name, container.name)][1], limit_bytes))
 
             except Exception as e:
                 print(f"⚠️ Error checking Pod {pod_name}: {e}")
                 all_pods_normal = False
 
-        if all_pods_normal:
-            print("✅ Memory stress has fully recovered!")
+        offenders = _over_threshold(samples, memory_usage_ratio_threshold)
+        for pod_name, container_name, usage_bytes, limit_bytes in offenders:
+            print(f"⚠️ High usage in {pod_name}/{container_name}: {usage_bytes / (1024 ** 2):.1f}MB / "
+                  f"{limit_bytes / (1024 ** 2):.1f}MB = {usage_bytes / limit_bytes:.1%} "
+                  f"≥ {memory_usage_ratio_threshold:.0%}")
+
+        if all_pods_normal and not offenders:
+            print(f"✅ Memory stress has fully recovered! {len(samples)} containers under "
+                  f"{memory_usage_ratio_threshold:.0%} of their limit.")
             return True
 
-        time.sleep(INTERVAL)
+        if _pause(stop_event):
+            return False
 
     print("❌ Timeout: memory stress not fully recovered.")
     return False
 
 
-def check_pod_ready_recovered(api, namespace, label_selector, timeout: int = START_TIMEOUT):
-    """Check whether Pods have recovered from NotReady to Ready state."""
+def check_pod_ready_recovered(api, namespace, label_selector, timeout: int = START_TIMEOUT,
+                              expected_count: int = 1, ready_timeout: float = START_TIMEOUT):
+    """
+    Check whether Pods have recovered from NotReady to Ready state.
+    expected_count is the number of Ready Pods to wait for (e.g., the workload's replica count).
+    """
     print("🔍 Checking if Pods have recovered to Ready state...")
+    timeout = min(timeout, ready_timeout)
     start_time = time.time()
 
     while time.time() - start_time < timeout:
-        pods = get_pod_list(api, namespace, label_selector)
-        if not pods:
-            print("⚠️ No target Pods found, waiting...")
-            time.sleep(START_CHECK_INTERVAL)
-            continue
-
-        all_ready = True
-        for pod in pods:
-            ready = check_pod_running_and_ready(pod)
-            if not ready:
-                print(f"⚠️ Pod {pod.metadata.name} is NotReady")
-                all_ready = False
-
-        if all_ready:
+        remaining = timeout - (time.time() - start_time)
+        if _wait_until_all_ready(api, namespace, label_selector, remaining, expected_count):
             # 🔹 All Pods are Ready; now verify that metrics are available
             print("✅ All Pods are in Running & Ready state. Checking metrics availability...")
 
-            try:
-                result = subprocess.run(
-                    ["kubectl", "top", "pod", "-n", namespace, "-l", label_selector],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    timeout=10
-                )
-                output = result.stdout + result.stderr
-
-                if "error: metrics not available" in output:
-                    print("⚠️ Metrics are not yet available, waiting...")
-                elif "No resources found" in output:
-                    print("⚠️ metrics-server returned empty results, waiting...")
-                elif result.returncode != 0:
-                    print(f"⚠️ Failed to retrieve metrics: {output.strip()}")
-                else:
-                    print("✅ Metrics are accessible. Pods have fully recovered!")
-                    return True
-
-            except subprocess.TimeoutExpired:
-                print("⚠️ Metrics retrieval timed out, retrying...")
+            if _fetch_container_usage(api, namespace, label_selector):
+                print("✅ Metrics are accessible. Pods have fully recovered!")
+                return True
+            print("⚠️ Metrics are not yet available, waiting...")
 
         time.sleep(START_CHECK_INTERVAL)
 
@@ -360,13 +446,115 @@ def check_pod_ready_recovered(api, namespace, label_selector, timeout: int = STA
     return False
 
 
+def _exec_in_pod(api, namespace, pod_name, command, container=None, timeout: int = 30):
+    """
+    Run a command inside a Pod through the exec API (no kubectl process) and return (returncode, output).
+    stdout and stderr are concatenated; failures reported on the error channel are appended to the output.
+    """
+    # stream() temporarily swaps the ApiClient's request method, so concurrent execs must not share it
+    with client.ApiClient(configuration=api.api_client.configuration) as exec_client:
+        resp = stream(
+            client.CoreV1Api(exec_client).connect_get_namespaced_pod_exec,
+            pod_name,
+            namespace,
+            command=command,
+            container=container,
+            stderr=True,
+            stdin=False,
+            stdout=True,
+            tty=False,
+            _preload_content=False
+        )
+        try:
+            resp.run_forever(timeout=timeout)
+            if resp.is_open():
+                raise TimeoutError(f"command {command} timed out after {timeout}s in {pod_name}")
+            output = resp.read_stdout() + resp.read_stderr()
+            error = resp.read_channel(ERROR_CHANNEL)
+        finally:
+            resp.close()
+
+    if not error:
+        return 0, output
+    status = json.loads(error)
+    if status.get("status") == "Success":
+        return 0, output
+    if status.get("reason") == "NonZeroExitCode":
+        for cause in status.get("details", {}).get("causes", []):
+            if cause.get("reason") == "ExitCode":
+                return int(cause["message"]), output
+    return 1, output + status.get("message", "")
+
+
+def _default_container(pod) -> str:
+    """
+    The container `kubectl exec` would pick: the default-container annotation, else the first container.
+    The exec API itself rejects multi-container Pods (e.g., with sidecar-busybox) without an explicit name.
+    """
+    annotations = pod.metadata.annotations or {}
+    return annotations.get("kubectl.kubernetes.io/default-container") or pod.spec.containers[0].name
+
+
+def _probe_pods(probe, pods):
+    """
+    Apply a per-pod probe to every Pod and return the results in order.
+    A single Pod (e.g., a standalone database) is probed inline without spinning up a thread pool.
+    """
+    if len(pods) == 1:
+        return [probe(pods[0])]
+    with ThreadPoolExecutor(max_workers=min(MAX_PROBE_WORKERS, len(pods))) as executor:
+        return list(executor.map(probe, pods))
+
+
+def _probe_pod_ping(api, namespace, pod, max_latency_ms, max_loss_percent):
+    """
+    Ping from inside a single Pod and evaluate packet loss and average latency.
+    Returns an (ok, reason) tuple so that probes can run concurrently and be reported afterwards.
+    """
+    ping_cmd = ["ping", "-c", "3", "-W", "2", "8.8.8.8"]
+    pod_name = pod.metadata.name
+
+    try:
+        # Prefer the main container for ping
+        try:
+            returncode, output = _exec_in_pod(api, namespace, pod_name, ping_cmd,
+                                              container=_default_container(pod))
+        except ApiException as e:
+            returncode, output = 1, f"OCI runtime exec failed: {e.reason}"
+
+        # If ping is unavailable in the main container, fall back to a sidecar (e.g., sidecar-busybox)
+        if "executable file not found" in output or "OCI runtime exec failed" in output:
+            returncode, output = _exec_in_pod(api, namespace, pod_name, ping_cmd, container="sidecar-busybox")
+        output = output.strip()
+
+        if returncode != 0 and "100% packet loss" not in output:
+            return False, f"⚠️ Ping command failed for {pod_name}: {output}"
+
+        # Parse packet loss percentage
+        match = _LOSS_RE.search(output)
+        packet_loss_percent = float(match.group(1)) if match else 100
+        if packet_loss_percent > max_loss_percent:
+            return False, f"🔴 Packet loss too high for {pod_name}: {packet_loss_percent}% > {max_loss_percent}%"
+
+        # Parse average round-trip latency
+        match = _RTT_RE.search(output)
+        avg_latency = float(match.group(1)) if match else None
+        if avg_latency is None or avg_latency > max_latency_ms:
+            return False, f"⚠️ Latency too high or parsing failed for {pod_name}: {avg_latency} ms"
+
+        return True, ""
+    except Exception as e:
+        return False, f"❌ Ping probe failed for {pod_name}: {e}"
+
+
 def check_ping_latency_recovered(
         api,
         namespace,
         label_selector,
         timeout: int = TIMEOUT,
         max_latency_ms=1000,
-        max_loss_percent=0
+        max_loss_percent=0,
+        ready_timeout: float = START_TIMEOUT
 ):
     """
     Verify network recovery by probing latency and packet loss via ping.
@@ -376,19 +564,10 @@ def check_ping_latency_recovered(
     print("🔍 Checking network recovery based on ping latency and packet loss...")
 
     # Wait for all Pods to become Running/Ready
-    start_time = time.time()
-    while time.time() - start_time < START_TIMEOUT:
-        pods = get_pod_list(api, namespace, label_selector)
-        if not pods:
-            print("⚠️ No target Pods found, waiting...")
-            time.sleep(START_CHECK_INTERVAL)
-            continue
-        if all(check_pod_running_and_ready(p) for p in pods):
-            break
-        print("⏳ Not all Pods are Running/Ready yet, continuing to wait...")
-        time.sleep(START_CHECK_INTERVAL)
+    if not _wait_until_all_ready(api, namespace, label_selector, ready_timeout):
+        return False
 
-    # Probe ping metrics for each Pod
+    # Probe ping metrics for all Pods (concurrently when there are several)
     start_time = time.time()
     while time.time() - start_time < timeout:
         pods = get_pod_list(api, namespace, label_selector)
@@ -397,64 +576,15 @@ def check_ping_latency_recovered(
             time.sleep(INTERVAL)
             continue
 
-        all_ok = True
-        for pod in pods:
-            pod_name = pod.metadata.name
-            # Prefer the main container for ping
-            cmd = ["kubectl", "exec", pod_name, "-n", namespace, "--", "ping", "-c", "3", "-W", "2", "8.8.8.8"]
-
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-                output = (result.stdout + result.stderr).strip()
-
-                # If ping is unavailable in the main container, fall back to a sidecar (e.g., sidecar-busybox)
-                if "executable file not found" in output or "OCI runtime exec failed" in output:
-                    cmd = [
-                        "kubectl", "exec", pod_name, "-c", "sidecar-busybox", "-n", namespace, "--",
-                        "ping", "-c", "3", "-W", "2", "8.8.8.8"
-                    ]
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-                    output = result.stdout.strip()
-
-                if result.returncode != 0 and "100% packet loss" not in output:
-                    print(f"⚠️ Ping command failed for {pod_name}: {result.stderr.strip()}")
-                    all_ok = False
-                    continue
-
-                # Parse packet loss percentage
-                packet_loss_percent = 100
-                for line in output.split('\n'):
-                    if "packet loss" in line and "transmitted" in line:
-                        try:
-                            packet_loss_percent = float(line.split(",")[2].strip().split("%")[0])
-                        except (IndexError, ValueError):
-                            packet_loss_percent = 100
-                        break
-                if packet_loss_percent > max_loss_percent:
-                    print(f"🔴 Packet loss too high for {pod_name}: {packet_loss_percent}% > {max_loss_percent}%")
-                    all_ok = False
-                    continue
-
-                # Parse average round-trip latency
-                avg_latency = None
-                for line in output.split('\n'):
-                    if "round-trip min/avg/max" in line or "rtt min/avg/max" in line:
-                        try:
-                            time_part = line.split("=")[1].strip().split()[0]
-                            avg_latency = float(time_part.split("/")[1])
-                        except (IndexError, ValueError):
-                            avg_latency = None
-                        break
-                if avg_latency is None or avg_latency > max_latency_ms:
-                    print(f"⚠️ Latency too high or parsing failed for {pod_name}: {avg_latency} ms")
-                    all_ok = False
-                    continue
+        results = _probe_pods(
+            lambda pod: _probe_pod_ping(api, namespace, pod, max_latency_ms, max_loss_percent),
+            pods
+        )
 
-            except Exception as e:
-                print(f"❌ Ping probe failed for {pod_name}: {e}")
-                all_ok = False
-
-        if all_ok:
+        for ok, reason in results:
+            if not ok:
+                print(reason)
+        if all(ok for ok, _ in results):
             print("✅ Network has recovered for all Pods (packet loss and latency within thresholds).")
             return True
 
@@ -464,12 +594,66 @@ def check_ping_latency_recovered(
     return False
 
 
+def _measure_write_speed_mb(api, namespace, pod) -> float:
+    """
+    Measure direct (O_DIRECT) write throughput in MB/s inside a Pod.
+    Uses fio's terse output when fio is installed, otherwise falls back to dd and its
+    "copied, <seconds> s" summary. The test file is removed afterwards in a separate exec,
+    since a timed-out or failed write never reaches the in-command cleanup.
+    """
+    fio_cmd = [
+        "fio", "--name=w", f"--filename={DISK_PROBE_FILE}", "--size=10M", "--bs=1M",
+        "--direct=1", "--rw=write", "--unlink=1", "--output-format=terse"
+    ]
+    pod_name = pod.metadata.name
+    container = _default_container(pod)
+    try:
+        returncode, output = _exec_in_pod(api, namespace, pod_name, fio_cmd, container=container, timeout=INTERVAL)
+        if "executable file not found" not in output and "OCI runtime exec failed" not in output:
+            if returncode != 0:
+                raise RuntimeError(output.strip())
+            fields = output.strip().splitlines()[-1].split(";")
+            return int(fields[FIO_TERSE_WRITE_BW_FIELD]) / 1024  # KiB/s -> MB/s
+
+        dd_cmd = [
+            "sh", "-c",
+            f"dd if=/dev/zero of={DISK_PROBE_FILE} bs=1M count=10 oflag=direct 2>&1; rm -f {DISK_PROBE_FILE}"
+        ]
+        _, output = _exec_in_pod(api, namespace, pod_name, dd_cmd, container=container, timeout=INTERVAL)
+        match = _DD_RE.search(output)
+        if not match:
+            raise RuntimeError(f"unexpected dd output: {output.strip()}")
+        return 10 / max(float(match.group(1)), 1e-6)
+    finally:
+        try:
+            _exec_in_pod(api, namespace, pod_name, ["rm", "-f", DISK_PROBE_FILE], container=container,
+                         timeout=INTERVAL)
+        except Exception as e:
+            log.debug("Failed to remove %s in %s: %s", DISK_PROBE_FILE, pod_name, e)
+
+
+def _probe_pod_disk_write(api, namespace, pod, min_write_speed_mb):
+    """
+    Write a test file inside a single Pod and compare the observed speed with the threshold.
+    Returns an (ok, reason) tuple so that probes can run concurrently and be reported afterwards.
+    """
+    pod_name = pod.metadata.name
+    try:
+        speed = _measure_write_speed_mb(api, namespace, pod)
+        if speed < min_write_speed_mb:
+            return False, f"⚠️ Write speed too low for {pod_name}: {speed:.2f} MB/s < {min_write_speed_mb} MB/s"
+        return True, ""
+    except Exception as e:
+        return False, f"❌ Disk write test failed for {pod_name}: {e}"
+
+
 def check_disk_io_performance(
         api,
         namespace,
         label_selector,
         timeout: int = TIMEOUT,
-        min_write_speed_mb=10
+        min_write_speed_mb=10,
+        ready_timeout: float = START_TIMEOUT
 ):
     """
     Assess disk write performance by writing a test file in each Pod.
@@ -478,19 +662,10 @@ def check_disk_io_performance(
     print("🔍 Checking if disk write performance has recovered...")
 
     # Wait for all Pods to become Running/Ready
-    start_time = time.time()
-    while time.time() - start_time < START_TIMEOUT:
-        pods = get_pod_list(api, namespace, label_selector)
-        if not pods:
-            print("⚠️ No target Pods found, waiting...")
-            time.sleep(START_CHECK_INTERVAL)
-            continue
-        if all(check_pod_running_and_ready(p) for p in pods):
-            break
-        print("⏳ Not all Pods are Running/Ready yet, continuing to wait...")
-        time.sleep(START_CHECK_INTERVAL)
+    if not _wait_until_all_ready(api, namespace, label_selector, ready_timeout):
+        return False
 
-    # Perform disk write test on each Pod
+    # Perform disk write test on all Pods (concurrently when there are several)
     start_time = time.time()
     while time.time() - start_time < timeout:
         pods = get_pod_list(api, namespace, label_selector)
@@ -499,46 +674,15 @@ def check_disk_io_performance(
             time.sleep(INTERVAL)
             continue
 
-        all_ok = True
-        for pod in pods:
-            pod_name = pod.metadata.name
-            cmd = [
-                "kubectl", "exec", pod_name, "-n", namespace, "--",
-                "sh", "-c",
-                "time_start=$(date +%s%3N); "
-                "dd if=/dev/zero of=/var/log/mysql/test-disk-write.tmp bs=1M count=10 oflag=direct 2>&1; "
-                "time_end=$(date +%s%3N); "
-                "echo $((time_end - time_start))"
-            ]
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=INTERVAL)
-                output = result.stdout.strip()
-                if not output:
-                    print(f"⚠️ No output from {pod_name}; execution may have failed")
-                    all_ok = False
-                    continue
-
-                duration_ms = int(output.split('\n')[-1])
-                if duration_ms == 0:
-                    duration_ms = 1  # Avoid division by zero
-                speed = 10 / (duration_ms / 1000)  # MB/s
-
-                if speed < min_write_speed_mb:
-                    print(f"⚠️ Write speed too low for {pod_name}: {speed:.2f} MB/s < {min_write_speed_mb} MB/s")
-                    all_ok = False
-                    continue
+        results = _probe_pods(
+            lambda pod: _probe_pod_disk_write(api, namespace, pod, min_write_speed_mb),
+            pods
+        )
 
-                # Clean up the test file
-                subprocess.run(
-                    ["kubectl", "exec", pod_name, "-n", namespace, "--",
-                     "rm", "-f", "/var/log/mysql/test-disk-write.tmp"],
-                    timeout=INTERVAL
-                )
-            except Exception as e:
-                print(f"❌ Disk write test failed for {pod_name}: {e}")
-                all_ok = False
-
-        if all_ok:
+        for ok, reason in results:
+            if not ok:
+                print(reason)
+        if all(ok for ok, _ in results):
             print("✅ Disk write performance has recovered for all Pods.")
             return True
 
@@ -552,41 +696,153 @@ def check_config_error_recovered(
         api: CoreV1Api,
         namespace: str,
         label_selector: str,
-        timeout: int = TIMEOUT
+        timeout: int = TIMEOUT,
+        ready_timeout: float = START_TIMEOUT
 ):
-    if timeout > 0:
-        return check_cpu_stress_recovered(api, namespace, label_selector, timeout) \
-            and check_memory_stress_recovered(api, namespace, label_selector, timeout)
-    else:
-        return check_cpu_stress_recovered(api, namespace, label_selector) \
-            and check_memory_stress_recovered(api, namespace, label_selector)
+    """
+    A configuration error is recovered once both CPU and memory usage are back within limits.
+    Both checks must pass, so they poll concurrently and the first failure decides the result;
+    the other check is then told to stop, and exits within one polling interval.
+    """
+    kwargs = {"timeout": timeout} if timeout > 0 else {}
+    kwargs["ready_timeout"] = ready_timeout
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(check_cpu_stress_recovered, api, namespace, label_selector,
+                            stop_event=stop_event, **kwargs),
+            executor.submit(check_memory_stress_recovered, api, namespace, label_selector,
+                            stop_event=stop_event, **kwargs)
+        ]
+        try:
+            for future in as_completed(futures):
+                if not future.result():
+                    return False
+            return True
+        finally:
+            # Leaving the with-block waits for the other check, which stops at its next pause
+            stop_event.set()
 
 
-def check(namespace, label, type, timeout=0):
-    KUBECONFIG_PATH = "/etc/rancher/k3s/k3s.yaml"
-    config.load_kube_config(config_file=KUBECONFIG_PATH)
-    api = client.CoreV1Api()
+def get_core_api() -> CoreV1Api:
+    """
+    Return a process-wide CoreV1Api, loading the kubeconfig only on first use
+    so that every check shares one ApiClient and its urllib3 connection pool.
+    """
+    global _core_api
+    with _api_lock:
+        if _core_api is None:
+            config.load_kube_config(config_file=KUBECONFIG_PATH)
+            configuration = client.Configuration.get_default_copy()
+            configuration.connection_pool_maxsize = MAX_PROBE_WORKERS
+            _core_api = client.CoreV1Api(client.ApiClient(configuration=configuration))
+    return _core_api
+
+
+def _reset_core_api():
+    """A forked child must not reuse the parent's pooled connections: it builds its own client on first use."""
+    global _core_api, _api_lock
+    _core_api = None
+    _api_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_core_api)
+
+
+# Failure type -> recovery check
+_DISPATCH: dict[str, Callable] = {
+    "cpu-stress": check_cpu_stress_recovered,
+    "memory-stress": check_memory_stress_recovered,
+    "pod-fail": check_pod_ready_recovered,
+    "network-loss": check_ping_latency_recovered,
+    "network-delay": check_ping_latency_recovered,
+    "disk-io": check_disk_io_performance,
+    "pod-config-error": check_config_error_recovered
+}
+
 
-    if type in failures.failures:
+@lru_cache(maxsize=None)
+def make_predicate(failure_type: str) -> Optional[Callable[..., bool]]:
+    """
+    Return the recovery predicate pred(namespace, label, timeout=0, ready_timeout=START_TIMEOUT)
+    for a failure type, or None if the type is unknown. Built once per type, so polling loops
+    only call it. ready_timeout bounds the initial wait for the Pods to become Running & Ready.
+    """
+    check_fn = _DISPATCH.get(failure_type)
+    if check_fn is None:
+        return None
+
+    def pred(namespace, label, timeout=0, ready_timeout=START_TIMEOUT):
+        api = get_core_api()
         if timeout > 0:
-            success = {
-                "cpu-stress": check_cpu_stress_recovered,
-                "memory-stress": check_memory_stress_recovered,
-                "pod-fail": check_pod_ready_recovered,
-                "network-loss": check_ping_latency_recovered,
-                "network-delay": check_ping_latency_recovered,
-                "disk-io": check_disk_io_performance,
-                "pod-config-error": check_config_error_recovered
-            }[type](api, namespace, label, timeout)
-        else:
-            success = {
-                "cpu-stress": check_cpu_stress_recovered,
-                "memory-stress": check_memory_stress_recovered,
-                "pod-fail": check_pod_ready_recovered,
-                "network-loss": check_ping_latency_recovered,
-                "network-delay": check_ping_latency_recovered,
-                "disk-io": check_disk_io_performance,
-                "pod-config-error": check_config_error_recovered
-            }[type](api, namespace, label)
-        return success
-    return False
+            return check_fn(api, namespace, label, timeout, ready_timeout=ready_timeout)
+        return check_fn(api, namespace, label, ready_timeout=ready_timeout)
+
+    return pred
+
+
+def check(namespace, label, type, timeout=0):
+    pred = make_predicate(type)
+    if pred is None:
+        return False
+    return pred(namespace, label, timeout)
+
+
+def _wait_for_check_result(namespace, label, type, expected: bool, timeout: float, interval: float,
+                           check_timeout: int) -> bool:
+    """
+    Block until the recovery check for `type` returns `expected` or the timeout expires.
+    The check is re-run as soon as a watch event reports a change to a matching Pod, so Pod-level
+    changes are seen immediately; conditions invisible to Pod events (metrics, latency, disk)
+    are still re-checked at least every `interval` seconds, starting at 1s and backing off.
+    Each check is bounded by the time left, so the whole wait honours `timeout`.
+    """
+    pred = make_predicate(type)
+    if pred is None:
+        return False
+    api = get_core_api()
+    deadline = time.monotonic() + timeout
+    resource_version = None
+    slice_seconds = 1
+
+    while True:
+        remaining = max(0, deadline - time.monotonic())
+        if bool(pred(namespace, label, max(1, min(check_timeout, int(remaining))), remaining)) == expected:
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+
+        w = watch.Watch()
+        try:
+            if resource_version is None:
+                resource_version = api.list_namespaced_pod(namespace, label_selector=label).metadata.resource_version
+            for event in w.stream(
+                    api.list_namespaced_pod,
+                    namespace,
+                    label_selector=label,
+                    resource_version=resource_version,
+                    timeout_seconds=max(1, int(min(slice_seconds, interval, remaining)))
+            ):
+                resource_version = event["object"].metadata.resource_version
+                # A matching Pod changed: re-evaluate right away
+                w.stop()
+                break
+        except Exception as e:
+            # e.g. 410 Gone (stale resourceVersion): re-list on the next round
+            log.debug("Pod watch interrupted: %s", e)
+            resource_version = None
+            time.sleep(max(0, min(slice_seconds, interval, deadline - time.monotonic())))
+        slice_seconds *= 2
+
+
+def wait_for_injection(namespace, label, type, timeout: float, interval: float = START_CHECK_INTERVAL,
+                       check_timeout: int = 5) -> bool:
+    """Block until the failure is observable (its recovery check fails) or the timeout expires."""
+    return _wait_for_check_result(namespace, label, type, False, timeout, interval, check_timeout)
+
+
+def wait_until_healthy(namespace, label, type, timeout: float, interval: float = INTERVAL,
+                       check_timeout: int = 5) -> bool:
+    """Block until the recovery check for `type` passes or the timeout expires."""
+    return _wait_for_check_result(namespace, label, type, True, timeout, interval, check_timeout)
@@ -1,76 +1,120 @@
+import hashlib
+import json
 import os
-import subprocess
-from kubernetes import client, config
+import threading
 import yaml
+from functools import lru_cache
+from kubernetes import client, utils
 from typing import Dict, Optional, Tuple
 
-from chaos.check_status import check_pod_ready_recovered
+try:
+    from yaml import CSafeLoader
+except ImportError:
+    from yaml import SafeLoader as CSafeLoader
 
-# Global cache: app_label -> (kind, name, yaml_str)
-_app_to_resource_cache: Optional[Dict[str, Tuple[str, str, str]]] = None
-KUBECONFIG_PATH = "/etc/rancher/k3s/k3s.yaml"
+from chaos.check_status import check_pod_ready_recovered, get_core_api
 
+# Global cache: app_label -> (kind, name, parsed manifest dict)
+_app_to_resource_cache: Optional[Dict[str, Tuple[str, str, dict]]] = None
+_load_lock = threading.Lock()
+# Manifest used when no path is given; set by the runner so worker processes share the same cache file
+MANIFEST_ENV_VAR = "MICROREMED_MANIFEST"
+# Container waiting reasons that mark a Running pod as stuck
+_RESTORE_WAITING_REASONS = frozenset({"CrashLoopBackOff", "ImagePullBackOff", "ErrImagePull"})
+FIELD_MANAGER = "microremed"
 
-def _load_original_resources(manifest_path: str):
+
+def _index_manifest_docs(docs) -> Dict[str, Tuple[str, str, dict]]:
     """
-    Load original YAML manifest and index resources by their 'app' label.
+    Index restorable resources (Deployment/StatefulSet/DaemonSet/Pod) by their 'app' label.
+    """
+    resources = {}
+    for doc in docs:
+        if not doc or "kind" not in doc or "metadata" not in doc:
+            continue
+
+        kind = doc["kind"]
+        name = doc["metadata"].get("name", "unknown")
+
+        try:
+            if kind in ("Deployment", "StatefulSet", "DaemonSet"):
+                app_label = doc["spec"]["template"]["metadata"]["labels"]["app"]
+            elif kind == "Pod":
+                app_label = doc["metadata"]["labels"]["app"]
+            else:
+                continue
+        except (KeyError, TypeError):
+            print(f"⚠️  Skipped {kind}/{name}: missing 'app' label")
+            continue
+
+        resources[app_label] = (kind, name, doc)
+    return resources
+
+
+def load_original_resources(manifest_path: Optional[str] = None):
+    """
+    Eagerly load the original manifest index (thread-safe, at most once per process).
+    Call it in the parent before starting workers so forked children inherit the parsed index;
+    spawned workers read the on-disk JSON cache of the manifest named by MICROREMED_MANIFEST.
     """
     global _app_to_resource_cache
     if _app_to_resource_cache is not None:
         return
+    with _load_lock:
+        if _app_to_resource_cache is None:
+            _app_to_resource_cache = _load_original_resources(manifest_path or os.environ[MANIFEST_ENV_VAR])
+
 
+def _load_original_resources(manifest_path: str) -> Dict[str, Tuple[str, str, dict]]:
+    """
+    Load original YAML manifest and index resources by their 'app' label.
+    The parsed index is cached next to the manifest as '<manifest>.<content hash>.json',
+    so later runs load JSON instead of re-parsing the YAML.
+    """
     if not os.path.exists(manifest_path):
         raise FileNotFoundError(f"Manifest file not found: {manifest_path}")
 
-    _app_to_resource_cache = {}
+    with open(manifest_path, "rb") as f:
+        content = f.read()
+    cache_path = f"{manifest_path}.{hashlib.blake2b(content).hexdigest()[:16]}.json"
 
-    with open(manifest_path, "r") as f:
-        docs = yaml.safe_load_all(f)
-        for doc in docs:
-            if not doc or "kind" not in doc or "metadata" not in doc:
-                continue
-
-            kind = doc["kind"]
-            name = doc["metadata"].get("name", "unknown")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            resources = {app: tuple(entry) for app, entry in json.load(f).items()}
+        print(f"✅ Loaded {len(resources)} restorable resources from {cache_path}")
+        return resources
 
-            try:
-                if kind in ("Deployment", "StatefulSet", "DaemonSet"):
-                    app_label = doc["spec"]["template"]["metadata"]["labels"]["app"]
-                elif kind == "Pod":
-                    app_label = doc["metadata"]["labels"]["app"]
-                else:
-                    continue
-            except (KeyError, TypeError):
-                print(f"⚠️  Skipped {kind}/{name}: missing 'app' label")
-                continue
+    resources = _index_manifest_docs(yaml.load_all(content, Loader=CSafeLoader))
 
-            yaml_str = yaml.dump(doc, default_flow_style=False, indent=2)
-            _app_to_resource_cache[app_label] = (kind, name, yaml_str)
+    # Write the cache atomically so a concurrent reader never sees a partial file
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(resources, f)
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"⚠️ Failed to write manifest cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-    print(f"✅ Loaded {len(_app_to_resource_cache)} restorable resources from {manifest_path}")
+    print(f"✅ Loaded {len(resources)} restorable resources from {manifest_path}")
+    return resources
 
 
-def get_original_resource_by_app(app_label: str, manifest_path: str) -> Optional[Tuple[str, str, str]]:
+def get_original_resource_by_app(app_label: str, manifest_path: Optional[str] = None) -> Optional[Tuple[str, str, dict]]:
     """
-    Retrieve the (kind, name, YAML string) tuple of a given app label.
+    Retrieve the (kind, name, manifest dict) tuple of a given app label.
     """
-    if _app_to_resource_cache is None:
-        _load_original_resources(manifest_path)
+    load_original_resources(manifest_path)
     return _app_to_resource_cache.get(app_label)
 
 
-def _extract_container_resources_from_yaml(yaml_str: str, container_name: str) -> Optional[Dict]:
-    try:
-        obj = yaml.safe_load(yaml_str)
-        containers = obj.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
-        for c in containers:
-            if c.get("name") == container_name:
-                return c.get("resources", {})
-        return None
-    except Exception:
-        return None
+def _extract_container_resources(doc: dict, container_name: str) -> Optional[Dict]:
+    containers = doc.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
+    return next((c.get("resources", {}) for c in containers if c.get("name") == container_name), None)
 
 
+@lru_cache(maxsize=512)
 def _normalize_resource_value(val) -> str:
     if not val:
         return ""
@@ -84,50 +128,43 @@ def _normalize_resource_value(val) -> str:
     return s
 
 
-def _normalize_resources(resources: dict) -> dict:
+def _freeze_resources(resources: dict) -> tuple:
+    """Hashable form of a {"requests": {...}, "limits": {...}} dict, used as the memoization key."""
     if not resources:
-        return {}
-    norm = {}
-    for section in ["requests", "limits"]:
-        if section in resources:
-            norm[section] = {
-                k: _normalize_resource_value(v)
-                for k, v in resources[section].items()
-                if k in ("cpu", "memory")
-            }
-    return norm
+        return ()
+    return tuple(
+        (section, tuple(sorted((resources[section] or {}).items())))
+        for section in ("requests", "limits")
+        if section in resources
+    )
+
+
+@lru_cache(maxsize=512)
+def _normalize_resources(frozen: tuple) -> tuple:
+    return tuple(
+        (section, tuple((k, _normalize_resource_value(v)) for k, v in items if k in ("cpu", "memory")))
+        for section, items in frozen
+    )
 
 
 def _resources_equal(res1: dict, res2: dict) -> bool:
-    return _normalize_resources(res1) == _normalize_resources(res2)
+    return _normalize_resources(_freeze_resources(res1)) == _normalize_resources(_freeze_resources(res2))
 
 
-def _get_current_pod_resources(namespace: str, app_label: str, container_name: str) -> Optional[Dict]:
-    try:
-        config.load_kube_config(config_file=KUBECONFIG_PATH)
-        v1 = client.CoreV1Api()
-        pods = v1.list_namespaced_pod(
-            namespace=namespace,
-            label_selector=f"app={app_label}"
-        ).items
-
-        if not pods:
-            return None
-
-        pod = next((p for p in pods if p.status.phase == "Running"), pods[0])
-
-        for c in pod.spec.containers:
-            if c.name == container_name:
-                res = c.resources
-                if not res:
-                    return {}
-                return {
-                    "requests": dict(res.requests or {}),
-                    "limits": dict(res.limits or {}),
-                }
-        return None
-    except Exception:
-        return None
+def _pod_container_resources(pod, container_name: str) -> Optional[Dict]:
+    """
+    Return the requests/limits of a container from an already-fetched pod object.
+    """
+    for c in pod.spec.containers:
+        if c.name == container_name:
+            res = c.resources
+            if not res:
+                return {}
+            return {
+                "requests": dict(res.requests or {}),
+                "limits": dict(res.limits or {}),
+            }
+    return None
 
 
 def _is_pod_abnormal(pod: any) -> bool:
@@ -138,16 +175,51 @@ def _is_pod_abnormal(pod: any) -> bool:
         if pod.status.phase != "Running":
             print(f"⚠️ Pod {pod.metadata.name} in phase={pod.status.phase}")
             return True
-        for condition in pod.status.conditions:
-            if condition.type == "Ready" and condition.status != "True":
-                print(f"⚠️ Pod {pod.metadata.name} in phase=Running, but not ready")
+        for cs in pod.status.container_statuses or []:
+            waiting = cs.state.waiting if cs.state else None
+            if waiting is not None and waiting.reason in _RESTORE_WAITING_REASONS:
+                print(f"⚠️ Pod {pod.metadata.name} container {cs.name} is in {waiting.reason}")
                 return True
+        ready_cond = next((c for c in pod.status.conditions or [] if c.type == "Ready"), None)
+        if ready_cond is None or ready_cond.status != "True":
+            print(f"⚠️ Pod {pod.metadata.name} in phase=Running, but not ready")
+            return True
         return False
     except Exception as e:
         print(f"⚠️ Error checking pod state: {e}")
         return False
 
 
+def _apply_manifest(api_client: client.ApiClient, kind: str, name: str, doc: dict, namespace: str):
+    """
+    Create the resource from its manifest dict, or replace it with the manifest if it already exists.
+    Replacing (at the live resourceVersion) resets the whole object, so fields added since the
+    original deployment, e.g. by a remediation's own apply or patch, are dropped as well.
+    """
+    try:
+        utils.create_from_yaml(api_client, yaml_objects=[doc], namespace=namespace)
+        return
+    except utils.FailToCreateError as e:
+        if any(err.status != 409 for err in e.api_exceptions):
+            raise
+
+    # Already exists: replace it with the original definition
+    if kind == "Pod":
+        core_api = client.CoreV1Api(api_client)
+        read, replace = core_api.read_namespaced_pod, core_api.replace_namespaced_pod
+    else:
+        apps_api = client.AppsV1Api(api_client)
+        read, replace = {
+            "Deployment": (apps_api.read_namespaced_deployment, apps_api.replace_namespaced_deployment),
+            "StatefulSet": (apps_api.read_namespaced_stateful_set, apps_api.replace_namespaced_stateful_set),
+            "DaemonSet": (apps_api.read_namespaced_daemon_set, apps_api.replace_namespaced_daemon_set),
+        }[kind]
+    live = read(name=name, namespace=namespace)
+    # Copy the cached manifest rather than mutating it
+    body = {**doc, "metadata": {**doc["metadata"], "resourceVersion": live.metadata.resource_version}}
+    replace(name=name, namespace=namespace, body=body, field_manager=FIELD_MANAGER)
+
+
 def restore_by_original_manifest(namespace: str, app_label: str,
                                  manifest_path: str) -> bool:
     """
@@ -164,12 +236,11 @@ def restore_by_original_manifest(namespace: str, app_label: str,
         print(f"❌ No definition found for app={app_label} in original manifest.")
         return False
 
-    kind, name, yaml_str = result
+    kind, name, doc = result
     print(f"🔄 Restoring {kind}/{name} (app={app_label}) ...")
 
-    # Load K8s client
-    config.load_kube_config(config_file=KUBECONFIG_PATH)
-    api = client.CoreV1Api()
+    # Shared K8s client (kubeconfig is loaded once per process)
+    api = get_core_api()
 
     # Get all pods for this app
     try:
@@ -178,7 +249,7 @@ def restore_by_original_manifest(namespace: str, app_label: str,
         print(f"⚠️ Failed to list pods: {e}")
         return False
 
-    target_resources = _extract_container_resources_from_yaml(yaml_str, container_name=app_label)
+    target_resources = _extract_container_resources(doc, container_name=app_label)
 
     # Step 1: Check each pod
     for pod in pods:
@@ -187,7 +258,7 @@ def restore_by_original_manifest(namespace: str, app_label: str,
 
         # Check resource differences
         if not pod_abnormal and target_resources is not None:
-            current_resources = _get_current_pod_resources(namespace, app_label, container_name=app_label)
+            current_resources = _pod_container_resources(pod, container_name=app_label)
             if current_resources is not None and not _resources_equal(target_resources, current_resources):
                 pod_abnormal = True
                 print(f"⚠️ Pod {pod_name} resources differ from original manifest")
@@ -202,29 +273,15 @@ def restore_by_original_manifest(namespace: str, app_label: str,
 
     # Step 2: Apply original manifest
     try:
-        cmd = ["kubectl", "apply", "-f", "-", "-n", namespace]
-        result_proc = subprocess.run(
-            cmd,
-            input=yaml_str,
-            text=True,
-            capture_output=True,
-            timeout=30
-        )
-
-        if result_proc.returncode != 0:
-            print(f"⚠️ Apply failed: {result_proc.stderr}")
-            return False
-
+        _apply_manifest(api.api_client, kind, name, doc, namespace)
         print(f"✅ Successfully applied {kind}/{name}. Waiting for pod recovery ...")
-    except subprocess.TimeoutExpired:
-        print("⚠️ Timeout while executing kubectl apply.")
-        return False
     except Exception as e:
-        print(f"⚠️ Exception during apply: {e}")
+        print(f"⚠️ Apply failed: {e}")
         return False
 
-    # Step 3: Wait for all pods to recover
-    if check_pod_ready_recovered(api, namespace, f"app={app_label}"):
+    # Step 3: Watch until the desired number of pods is Running & Ready
+    expected_count = doc.get("spec", {}).get("replicas", 1) if kind in ("Deployment", "StatefulSet") else 1
+    if check_pod_ready_recovered(api, namespace, f"app={app_label}", expected_count=expected_count):
         print("✅ Pod successfully recovered and ready.")
         return True
     else:
@@ -1,9 +1,74 @@
 from chaos.failures import stop_chaos
 
 import os
-import json
+import re
 import subprocess
 from kubernetes import client, config
+from kubernetes.client.rest import ApiException
+
+
+# (namespace, app label) -> owning Deployment name, reused across injections
+_deployment_name_cache = {}
+
+
+def _owns_app(deployment, app_label):
+    labels = deployment.spec.template.metadata.labels or {}
+    return labels.get("app") == app_label
+
+
+def _find_owner_deployment(apps_api, pod, app_label, namespace):
+    """
+    Return the Deployment owning the pod, or None.
+    The name is derived from the ReplicaSet name (<deployment>-<pod-template-hash>) and
+    confirmed by reading the Deployment; the ReplicaSet is only read when that guess fails.
+    """
+    key = (namespace, app_label)
+    rs_ref = next((ref for ref in pod.metadata.owner_references or [] if ref.kind == "ReplicaSet"), None)
+    deployment_name = _deployment_name_cache.get(key)
+    if deployment_name is None and rs_ref is not None:
+        deployment_name = rs_ref.name.rsplit("-", 1)[0]
+
+    deployment = None
+    if deployment_name is not None:
+        try:
+            deployment = apps_api.read_namespaced_deployment(name=deployment_name, namespace=namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+        if deployment is not None and not _owns_app(deployment, app_label):
+            deployment = None
+
+    if deployment is None and rs_ref is not None:
+        # Fall back to the ReplicaSet's own owner reference
+        rs = apps_api.read_namespaced_replica_set(rs_ref.name, namespace)
+        owner = next((ref for ref in rs.metadata.owner_references or [] if ref.kind == "Deployment"), None)
+        if owner is not None:
+            deployment = apps_api.read_namespaced_deployment(name=owner.name, namespace=namespace)
+
+    if deployment is None:
+        _deployment_name_cache.pop(key, None)
+    else:
+        _deployment_name_cache[key] = deployment.metadata.name
+    return deployment
+
+
+# failure_type -> chaos template prepared for str.format_map, read from disk once per process
+_template_cache = {}
+_PLACEHOLDER_RE = re.compile(r"\[(target_pod|target_namespace)\]")
+
+
+def _load_template(failure_type):
+    template = _template_cache.get(failure_type)
+    if template is None:
+        template_path = f"chaos/templates/{failure_type}.yaml"
+        if not os.path.exists(template_path):
+            raise FileNotFoundError(f"[ERROR] Chaos template not found: {template_path}")
+        with open(template_path, "r") as f:
+            content = f.read()
+        # Escape literal braces, then turn [target_pod]/[target_namespace] into format fields
+        content = content.replace("{", "{{").replace("}", "}}")
+        template = _template_cache[failure_type] = _PLACEHOLDER_RE.sub(r"{\1}", content)
+    return template
 
 
 def inject_failure(failure_type, target_pod, target_namespace):
@@ -30,27 +95,13 @@ def inject_failure(failure_type, target_pod, target_namespace):
                 return False
             pod = pods[0]
 
-            # Traverse ownerReferences to find the top-level Deployment
-            owner_refs = pod.metadata.owner_references
-            deployment_name = None
-            for ref in owner_refs or []:
-                if ref.kind == "ReplicaSet":
-                    # Fetch the ReplicaSet and inspect its owner
-                    rs_name = ref.name
-                    rs = apps_api.read_namespaced_replica_set(rs_name, target_namespace)
-                    for rs_ref in rs.metadata.owner_references or []:
-                        if rs_ref.kind == "Deployment":
-                            deployment_name = rs_ref.name
-                            break
-            if not deployment_name:
+            deployment = _find_owner_deployment(apps_api, pod, target_pod, target_namespace)
+            if deployment is None:
                 print(f"[ERROR] Failed to trace Deployment from pod {pod.metadata.name}")
                 return False
+            deployment_name = deployment.metadata.name
 
-            # 2️⃣ Retrieve the Deployment and patch its container resource limits/requests
-            deployment = apps_api.read_namespaced_deployment(
-                name=deployment_name, namespace=target_namespace
-            )
-
+            # 2️⃣ Patch the Deployment's container resource limits/requests
             containers = deployment.spec.template.spec.containers
             if not containers:
                 print(f"[ERROR] Deployment {deployment_name} contains no containers")
@@ -75,11 +126,10 @@ def inject_failure(failure_type, target_pod, target_namespace):
                 }
             }
 
-            patch_str = json.dumps(patch)
             _ = apps_api.patch_namespaced_deployment(
                 name=deployment_name,
                 namespace=target_namespace,
-                body=json.loads(patch_str)
+                body=patch
             )
 
             print(f"[INFO] Successfully injected resource misconfiguration into Deployment {deployment_name}")
@@ -88,25 +138,16 @@ def inject_failure(failure_type, target_pod, target_namespace):
             print(f"[ERROR] Exception during config error injection: {e}")
             return False
     else:
-        # Prepare chaos YAML by replacing placeholders [target_pod] and [target_namespace]
-        template_path = f"chaos/templates/{failure_type}.yaml"
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(f"[ERROR] Chaos template not found: {template_path}")
-
-        with open(template_path, "r") as f:
-            template_content = f.read()
-        updated_content = template_content.replace("[target_pod]", target_pod)
-        updated_content = updated_content.replace("[target_namespace]", target_namespace)
-
-        inject_file = f"chaos/templates/{failure_type}.yaml.injecting"
-        with open(inject_file, "w") as f:
-            f.write(updated_content)
-        print(f"[INFO] Generated injection manifest: {inject_file}")
+        # Render chaos YAML in memory, filling placeholders [target_pod] and [target_namespace] in one pass
+        rendered = _load_template(failure_type).format_map(
+            {"target_pod": target_pod, "target_namespace": target_namespace}
+        )
 
         # Apply the chaos experiment
         try:
             result = subprocess.run(
-                ["kubectl", "apply", "-f", inject_file],
+                ["kubectl", "apply", "-f", "-"],
+                input=rendered,
                 capture_output=True,
                 text=True,
                 timeout=10
@@ -123,15 +164,14 @@ def inject_failure(failure_type, target_pod, target_namespace):
 
 def stop_injection(failure_type, target_namespace):
     """
-    Stop the injected failure and clean up temporary resources.
+    Stop the injected failure.
     For 'pod-config-error', no immediate rollback is performed—recovery is handled externally.
-    For other chaos types, execute the corresponding stop command and remove the temporary manifest.
+    For other chaos types, execute the corresponding stop command.
     """
     if failure_type == "pod-config-error":
         # Configuration errors are not reverted here; recovery is managed by a separate reconciliation process
         pass
     else:
-        inject_file = f"chaos/templates/{failure_type}.yaml.injecting"
         # Stop the chaos experiment if a stop command is defined
         if failure_type in stop_chaos:
             stop_cmd = stop_chaos[failure_type].replace("[target_namespace]", target_namespace)
@@ -146,6 +186,3 @@ def stop_injection(failure_type, target_namespace):
             except subprocess.TimeoutExpired:
                 pass  # Ignore timeout during cleanup
             print("[INFO] Chaos experiment stopped successfully.")
-        # Clean up the temporary injection file
-        if os.path.exists(inject_file):
-            os.remove(inject_file)
@@ -2,199 +2,241 @@ import random
 
 import subprocess
 import time
-import sys
+
+import urllib3
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+from chaos.check_status import get_core_api
+from chaos.failures import failures
 
 MAX_RETRIES = 60  # up to ~5 min (60 * 5s)
 RETRY_INTERVAL = 5
 
+_ENVS = ("simple-micro", "train-ticket", "online-boutique")
+_FAILURES = tuple(failures)
+
+# (target_env, failure_type) -> candidate services; failure_type None is the default pool
+_SERVICES = {
+    ("simple-micro", None): ("hello-service", "time-service"),
+    ("train-ticket", "disk-io"): ("nacosdb-mysql",),
+    ("train-ticket", None): (
+        "ts-admin-basic-info-service",
+        "ts-admin-order-service",
+        "ts-admin-route-service",
+        "ts-admin-travel-service",
+        "ts-admin-user-service",
+        "ts-assurance-service",
+        "ts-auth-service",
+        "ts-avatar-service",
+        "ts-basic-service",
+        "ts-cancel-service",
+        "ts-config-service",
+        "ts-consign-price-service",
+        "ts-consign-service",
+        "ts-contacts-service",
+        "ts-delivery-service",
+        "ts-execute-service",
+        "ts-food-delivery-service",
+        "ts-food-service",
+        "ts-gateway-service",
+        "ts-inside-payment-service",
+        "ts-news-service",
+        "ts-notification-service",
+        "ts-order-other-service",
+        "ts-order-service",
+        "ts-payment-service",
+        "ts-preserve-other-service",
+        "ts-preserve-service",
+        "ts-price-service",
+        "ts-rebook-service",
+        "ts-route-plan-service",
+        "ts-route-service",
+        "ts-seat-service",
+        "ts-security-service",
+        "ts-station-food-service",
+        "ts-station-service",
+        "ts-ticket-office-service",
+        "ts-train-food-service",
+        "ts-train-service",
+        "ts-travel-plan-service",
+        "ts-travel-service",
+        "ts-travel2-service",
+        "ts-ui-dashboard",
+        "ts-user-service",
+        "ts-verification-code-service",
+        "ts-voucher-service",
+        "ts-wait-order-service",
+    ),
+    ("online-boutique", "disk-io"): (
+        "adservice",
+        "cartservice",
+        "checkoutservice",
+        "currencyservice",
+        "emailservice",
+        "frontend",
+        "loadgenerator",
+        "paymentservice",
+        "productcatalogservice",
+        "recommendationservice",
+        "shippingservice",
+    ),
+    ("online-boutique", None): (
+        "adservice",
+        "cartservice",
+        "checkoutservice",
+        "currencyservice",
+        "emailservice",
+        "frontend",
+        "loadgenerator",
+        "paymentservice",
+        "productcatalogservice",
+        "recommendationservice",
+        "redis-cart",
+        "shippingservice",
+    ),
+}
+
 
 def run_cmd(cmd, capture_output=True):
-    """Run shell command and return output or error"""
+    """Run a command (argv list, no shell) and return output or error"""
     try:
         result = subprocess.run(
-            cmd, shell=True, capture_output=capture_output, text=True, check=False
+            cmd, capture_output=capture_output, text=True, check=False
         )
-        return result.stdout.strip(), result.stderr.strip(), result.returncode
+        return (result.stdout or "").strip(), (result.stderr or "").strip(), result.returncode
     except Exception as e:
         return "", str(e), 1
 
 
-def deploy_env(env_name):
-    print(f"=== [Deploy] Deploying environment: {env_name} ===")
+def _is_pod_ready(pod):
+    """A pod counts as ready when it is Running, not terminating, and all its containers are ready."""
+    if pod.metadata.deletion_timestamp is not None or pod.status.phase != "Running":
+        return False
+    return all(cs.ready for cs in pod.status.container_statuses or [])
+
+
+def _wait_for_pods_ready(namespace, deadline):
+    """
+    Wait until every pod in the namespace is Running & Ready, or until the monotonic deadline.
+    The pod list is fetched once and then kept up to date from watch events pushed by the API server;
+    API and connection errors are retried (re-list, then re-watch) until the deadline.
+    """
+    v1 = get_core_api()
+    pod_ready = {}
+    expected_count = 0
+    resource_version = None
+
+    def all_ready():
+        return len(pod_ready) >= max(expected_count, 1) and all(pod_ready.values())
+
+    while time.monotonic() < deadline:
+        try:
+            if resource_version is None:
+                pods = v1.list_namespaced_pod(namespace)
+                expected_count = max(expected_count, len(pods.items))
+                pod_ready = {p.metadata.name: _is_pod_ready(p) for p in pods.items}
+                resource_version = pods.metadata.resource_version
+            if all_ready():
+                return True
+
+            if not pod_ready:
+                print(f"[WARN] No pods found in namespace '{namespace}' yet, watching...")
+            else:
+                print(f"[INFO] Waiting for {sum(not ready for ready in pod_ready.values())} pod(s) to become Ready...")
+            w = watch.Watch()
+            for event in w.stream(
+                    v1.list_namespaced_pod,
+                    namespace,
+                    resource_version=resource_version,
+                    timeout_seconds=max(1, int(deadline - time.monotonic()))
+            ):
+                pod = event["object"]
+                resource_version = pod.metadata.resource_version
+                if event["type"] == "DELETED":
+                    pod_ready.pop(pod.metadata.name, None)
+                else:
+                    pod_ready[pod.metadata.name] = _is_pod_ready(pod)
+                if all_ready():
+                    w.stop()
+                    return True
+        except (ApiException, urllib3.exceptions.HTTPError, OSError) as e:
+            # e.g. 410 Gone (resourceVersion too old) or a dropped connection: re-list and re-watch
+            print(f"[WARN] Pod list/watch failed in namespace '{namespace}': {e}; retrying...")
+            resource_version = None
+            time.sleep(min(RETRY_INTERVAL, max(0, deadline - time.monotonic())))
+
+    return all_ready()
+
+
+def _pods_missing_metrics(namespace):
+    """
+    Return the names of pods in the namespace that metrics-server has no sample for yet,
+    or None while the metrics.k8s.io API is unavailable, fails, or returns no pods at all.
+    """
+    v1 = get_core_api()
+    try:
+        metrics = client.CustomObjectsApi(v1.api_client).list_namespaced_custom_object(
+            group="metrics.k8s.io", version="v1beta1", namespace=namespace, plural="pods"
+        )
+        with_metrics = {item["metadata"]["name"] for item in metrics.get("items", [])}
+        if not with_metrics:
+            return None
+        return [p.metadata.name for p in v1.list_namespaced_pod(namespace).items if p.metadata.name not in with_metrics]
+    except Exception as e:
+        # Any error means "metrics not ready yet": the caller keeps polling until its deadline
+        print(f"[WARN] Failed to query pod metrics in namespace '{namespace}': {e}")
+        return None
+
+
+def deploy_env(env_name, namespace=None):
+    """
+    (Re)deploy an environment into `namespace` (default: the environment's own namespace)
+    and wait until its pods are Ready and reporting metrics.
+    Raises RuntimeError when deploy.sh fails, so callers (including pool workers) can report it.
+    """
+    namespace = namespace or env_name
+    print(f"=== [Deploy] Deploying environment: {env_name} (namespace '{namespace}') ===")
 
     # run deploy.sh
-    deploy_cmd = f"bash envs/{env_name}/deploy.sh"
+    deploy_cmd = ["bash", f"envs/{env_name}/deploy.sh", namespace]
     out, err, code = run_cmd(deploy_cmd)
     if code != 0:
-        print(f"❌ Deployment failed: {err or out}")
-        sys.exit(1)
+        raise RuntimeError(f"Deployment of '{env_name}' into namespace '{namespace}' failed: {err or out}")
 
-    print(f"=== [Check] Waiting for all pods in namespace '{env_name}' "
+    print(f"=== [Check] Waiting for all pods in namespace '{namespace}' "
           f"to become Running, Ready, and Metrics-Available ===")
 
-    for i in range(1, MAX_RETRIES + 1):
-        out, err, code = run_cmd(f"kubectl get pods -n {env_name} --no-headers 2>/dev/null")
-        pod_status = out.strip()
-
-        if not pod_status:
-            print(f"[WARN] No pods found in namespace '{env_name}' (attempt {i}/{MAX_RETRIES})")
+    deadline = time.monotonic() + MAX_RETRIES * RETRY_INTERVAL
+    if _wait_for_pods_ready(namespace, deadline):
+        print(f"[INFO] All pods are Running and Ready — checking metrics availability...")
+
+        while time.monotonic() < deadline:
+            missing = _pods_missing_metrics(namespace)
+            if missing is None:
+                print(f"[WARN] Metrics-server returned no pods")
+            elif missing:
+                print(f"[WARN] Metrics not yet available for {len(missing)} pod(s)")
+            else:
+                print(f"✅ All pods are Running, Ready, and have available metrics in namespace '{namespace}'")
+                return True
             time.sleep(RETRY_INTERVAL)
-            continue
-
-        # check running/ready
-        not_ready = any("Running" not in line for line in pod_status.splitlines())
-        partial_running = any(
-            (len(cols := line.split()) > 1 and "/" in cols[1] and cols[1].split("/")[0] != cols[1].split("/")[1])
-            for line in pod_status.splitlines()
-        )
-
-        if not not_ready and not partial_running:
-            print(f"[INFO] All pods are Running and Ready — checking metrics availability...")
-
-            metrics_out, metrics_err, _ = run_cmd(f"kubectl top pod -n {env_name} 2>&1 || true")
-
-            if "error: metrics not available" in metrics_out or "error: metrics not available" in metrics_err:
-                print(f"[WARN] Metrics not yet available for some pods (attempt {i}/{MAX_RETRIES})")
-                time.sleep(RETRY_INTERVAL)
-                continue
-
-            if "No resources found" in metrics_out:
-                print(f"[WARN] Metrics-server returned no pods (attempt {i}/{MAX_RETRIES})")
-                time.sleep(RETRY_INTERVAL)
-                continue
-
-            print(f"✅ All pods are Running, Ready, and have available metrics in namespace '{env_name}'")
-            return True
-
-        print(f"[INFO] Waiting... (attempt {i}/{MAX_RETRIES})")
-        time.sleep(RETRY_INTERVAL)
 
     # timeout
     print("❌ Timeout: Some pods did not reach Running & Ready state or metrics unavailable within expected time.")
     print("--- Pod status ---")
-    run_cmd(f"kubectl get pods -n {env_name}", capture_output=False)
+    run_cmd(["kubectl", "get", "pods", "-n", namespace], capture_output=False)
     print("--- Metrics status ---")
-    run_cmd(f"kubectl top pod -n {env_name} 2>&1 || true", capture_output=False)
+    run_cmd(["kubectl", "top", "pod", "-n", namespace], capture_output=False)
     return False
 
 
 def get_random_failure(target_env):
-    if target_env == "simple-micro":
-        return random.choice([
-            "cpu-stress",
-            "memory-stress",
-            "pod-fail",
-            "network-loss",
-            "network-delay",
-            "disk-io",
-            "pod-config-error"
-        ])
-    elif target_env == "train-ticket":
-        return random.choice([
-            "cpu-stress",
-            "memory-stress",
-            "pod-fail",
-            "network-loss",
-            "network-delay",
-            "disk-io",
-            "pod-config-error"
-        ])
-    elif target_env == "online-boutique":
-        return random.choice([
-            "cpu-stress",
-            "memory-stress",
-            "pod-fail",
-            "network-loss",
-            "network-delay",
-            "disk-io",
-            "pod-config-error"
-        ])
+    if target_env in _ENVS:
+        return random.choice(_FAILURES)
 
 
 def get_random_service(target_env, failure_type):
-    if target_env == "simple-micro":
-        return random.choice(["hello-service", "time-service"])
-    elif target_env == "train-ticket":
-        if failure_type == "disk-io":
-            return random.choice([
-                "nacosdb-mysql"
-            ])
-        else:
-            return random.choice([
-                "ts-admin-basic-info-service",
-                "ts-admin-order-service",
-                "ts-admin-route-service",
-                "ts-admin-travel-service",
-                "ts-admin-user-service",
-                "ts-assurance-service",
-                "ts-auth-service",
-                "ts-avatar-service",
-                "ts-basic-service",
-                "ts-cancel-service",
-                "ts-config-service",
-                "ts-consign-price-service",
-                "ts-consign-service",
-                "ts-contacts-service",
-                "ts-delivery-service",
-                "ts-execute-service",
-                "ts-food-delivery-service",
-                "ts-food-service",
-                "ts-gateway-service",
-                "ts-inside-payment-service",
-                "ts-news-service",
-                "ts-notification-service",
-                "ts-order-other-service",
-                "ts-order-service",
-                "ts-payment-service",
-                "ts-preserve-other-service",
-                "ts-preserve-service",
-                "ts-price-service",
-                "ts-rebook-service",
-                "ts-route-plan-service",
-                "ts-route-service",
-                "ts-seat-service",
-                "ts-security-service",
-                "ts-station-food-service",
-                "ts-station-service",
-                "ts-ticket-office-service",
-                "ts-train-food-service",
-                "ts-train-service",
-                "ts-travel-plan-service",
-                "ts-travel-service",
-                "ts-travel2-service",
-                "ts-ui-dashboard",
-                "ts-user-service",
-                "ts-verification-code-service",
-                "ts-voucher-service",
-                "ts-wait-order-service"
-            ])
-    elif target_env == "online-boutique":
-        if failure_type == "disk-io":
-            return random.choice([
-                "adservice",
-                "cartservice",
-                "checkoutservice",
-                "currencyservice",
-                "emailservice",
-                "frontend",
-                "loadgenerator",
-                "paymentservice",
-                "productcatalogservice",
-                "recommendationservice",
-                "shippingservice"
-            ])
-        else:
-            return random.choice([
-                "adservice",
-                "cartservice",
-                "checkoutservice",
-                "currencyservice",
-                "emailservice",
-                "frontend",
-                "loadgenerator",
-                "paymentservice",
-                "productcatalogservice",
-                "recommendationservice",
-                "redis-cart",
-                "shippingservice"
-            ])
+    candidates = _SERVICES.get((target_env, failure_type)) or _SERVICES.get((target_env, None))
+    if candidates:
+        return random.choice(candidates)
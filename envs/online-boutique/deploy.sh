@@ -3,6 +3,9 @@
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR" || exit 1
 
-kubectl delete namespace online-boutique
-kubectl create namespace online-boutique
-kubectl apply -f kubernetes-manifests.yaml -n kubernetes-manifests.yaml -n online-boutique
\ No newline at end of file
+# Target namespace (default: online-boutique); parallel experiment workers deploy their own copy
+NAMESPACE="${1:-online-boutique}"
+
+kubectl delete namespace "$NAMESPACE"
+kubectl create namespace "$NAMESPACE"
+kubectl apply -f kubernetes-manifests.yaml -n "$NAMESPACE"
\ No newline at end of file
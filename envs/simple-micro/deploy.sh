@@ -3,6 +3,9 @@
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR" || exit 1
 
-kubectl delete namespace simple-micro
-kubectl create namespace simple-micro
-kubectl apply -f ./k8s-deploy.yaml -n simple-micro
\ No newline at end of file
+# Target namespace (default: simple-micro); parallel experiment workers deploy their own copy
+NAMESPACE="${1:-simple-micro}"
+
+kubectl delete namespace "$NAMESPACE"
+kubectl create namespace "$NAMESPACE"
+kubectl apply -f ./k8s-deploy.yaml -n "$NAMESPACE"
\ No newline at end of file
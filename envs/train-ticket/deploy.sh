@@ -3,6 +3,9 @@
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR" || exit 1
 
-kubectl delete namespace train-ticket
-kubectl create namespace train-ticket
-make deploy
\ No newline at end of file
+# Target namespace (default: train-ticket); parallel experiment workers deploy their own copy
+NAMESPACE="${1:-train-ticket}"
+
+kubectl delete namespace "$NAMESPACE"
+kubectl create namespace "$NAMESPACE"
+make deploy Namespace="$NAMESPACE"
\ No newline at end of file
@@ -1,45 +1,268 @@
 import json
 import os
+import sys
 import time
 import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import lru_cache
 
 from config import set_config
 from methods.remediate import remediate
 from chaos import check_status
-from chaos.deployment import restore_by_original_manifest
+from chaos.deployment import MANIFEST_ENV_VAR, load_original_resources, restore_by_original_manifest
 from envs.env import get_random_service, get_random_failure, deploy_env
 from chaos.injection import inject_failure, stop_injection
 
+try:
+    import orjson
 
-def _save_conversation(save_path: str, log_data: list, **metadata):
+    def _dumps_line(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    def _dumps_line(obj) -> bytes:
+        return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+# Minimum seconds between two redeploys of the whole environment
+DEPLOY_COOLDOWN = 30
+_last_deploy_at = None
+# A workload restored successfully within this many seconds is trusted to be healthy
+PREFLIGHT_SKIP_WINDOW = 30
+# (namespace, pod, monotonic time) of the last successful restore in this process
+_last_restored = None
+
+
+class ConversationLogger:
+    """
+    Append-only JSONL conversation log: one message per line, written as the conversation grows,
+    so a crash mid-remediation keeps everything logged so far. The final line holds the metadata.
+    The newest message is held back until the next one arrives (or close), because chat_api may
+    still rewrite it in place (TOOL_CALL_PROMPT) and the log must show what was actually sent.
+    """
+
+    def __init__(self, save_path: str, flush_interval: float = 0.25, flush_every: int = 10):
+        os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+        self.save_path = save_path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._f = open(save_path, "wb")
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._held = None
+        # Running token estimate, so the total never requires re-walking the conversation
+        self.token_count = 0
+
+    def append(self, message: dict):
+        self._write_held()
+        self._held = message
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _write_held(self):
+        if self._held is None:
+            return
+        message, self._held = self._held, None
+        self._f.write(_dumps_line(message))
+        self.token_count += _count_tokens(str(message.get("content") or ""))
+        self._pending += 1
+
+    def flush(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self, **metadata):
+        """Write the held message and the trailing metadata line (with the token count), then close the file."""
+        if self._f.closed:
+            return
+        self._write_held()
+        metadata = {"generated_at": time.time(), "token_count": self.token_count, **metadata}
+        self._f.write(_dumps_line({"metadata": metadata}))
+        self.flush()
+        self._f.close()
+        print(f"✅ Conversation log saved to: {self.save_path}")
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """cl100k_base tokenizer, or None when tiktoken (or its BPE file) is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def _count_tokens(content: str) -> int:
+    """Token estimate for one message content, encoded inline (no thread pool for a single string)."""
+    encoder = _get_encoder()
+    if encoder is None:
+        return len(content) // 4
+    return len(encoder.encode(content))
+
+
+def _deploy_env_with_cooldown(target_env: str, namespace=None):
+    """
+    Redeploy the environment (into `namespace`, default: its own namespace),
+    but never more often than once every DEPLOY_COOLDOWN seconds.
+    """
+    global _last_deploy_at
+    if _last_deploy_at is not None:
+        wait_time = DEPLOY_COOLDOWN - (time.monotonic() - _last_deploy_at)
+        if wait_time > 0:
+            print(f"[INFO] Last redeploy was less than {DEPLOY_COOLDOWN}s ago, waiting {wait_time:.0f}s...")
+            time.sleep(wait_time)
+    deploy_env(target_env, namespace)
+    _last_deploy_at = time.monotonic()
+
+
+def _recently_restored(namespace: str, target_pod: str) -> bool:
+    if _last_restored is None:
+        return False
+    restored_namespace, restored_pod, restored_at = _last_restored
+    return ((restored_namespace, restored_pod) == (namespace, target_pod)
+            and time.monotonic() - restored_at < PREFLIGHT_SKIP_WINDOW)
+
+
+def _wait_for_injection(namespace: str, target_pod: str, failure_type: str, args) -> bool:
+    """Wait up to --injection-timeout seconds for the injected failure to become observable."""
+    # Event-driven: returns as soon as a Pod change makes the failure observable
+    return check_status.wait_for_injection(namespace, f"app={target_pod}", failure_type,
+                                           args.injection_timeout, args.wait_interval)
+
+
+def _run_one_experiment(experiment_no: int, failure_type: str, target_pod: str, namespace: str, args) -> dict:
     """
-    Save conversation log and metadata to a JSON file.
+    Inject one failure, let the chosen method remediate it, then stop the injection and restore the workload.
+    Returns a result dict whose "outcome" is "restart" (the system was unhealthy and has been redeployed,
+    so the experiment should be re-drawn), "injection_failed", or "remediated".
     """
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    full_log = {
-        "metadata": {
-            "generated_at": time.time(),
-            **metadata
-        },
-        "conversation": log_data
+    global _last_restored
+    target_env = args.env or "default-env"
+    # Parallel workers heal their own namespace; the serial run redeploys the environment's namespace
+    deploy_namespace = namespace if namespace != args.namespace else None
+    print(f"[INFO] Injecting failure '{failure_type}' on target pod '{target_pod}' (namespace '{namespace}')")
+
+    if _recently_restored(namespace, target_pod):
+        print(f"[INFO] '{target_pod}' was just restored, skipping the pre-flight health check")
+    elif not check_status.check(namespace, f"app={target_pod}", "pod-fail"):
+        print(f"[INFO] Unable to get a health service, restarting whole system...")
+        _deploy_env_with_cooldown(target_env, deploy_namespace)
+        return {"outcome": "restart", "failure_type": failure_type}
+
+    injection_status = inject_failure(failure_type, target_pod, namespace)
+    if not injection_status:
+        return {"outcome": "injection_failed", "failure_type": failure_type}
+
+    print(f"[INFO] Chaos YAML applied successfully. Monitoring injection status...")
+
+    if not _wait_for_injection(namespace, target_pod, failure_type, args):
+        print(f"[WARN] Injection timeout for {failure_type} on {target_pod}")
+        # Stop the chaos experiment
+        stop_injection(failure_type, namespace)
+        if args.enable_strict_restart:
+            print(f"[INFO] In strict restart mode, restarting whole system...")
+            _deploy_env_with_cooldown(target_env, deploy_namespace)
+            return {"outcome": "restart", "failure_type": failure_type}
+        return {"outcome": "injection_failed", "failure_type": failure_type}
+
+    print(f"[INFO] Failure '{failure_type}' on '{target_pod}' successfully injected.")
+
+    # Start remediation process
+    print("[INFO] Initiating failure remediation sequence...")
+    start_time_remediation = time.time()
+    log_name = f"{target_pod}_{failure_type}_{int(start_time_remediation)}.jsonl"
+    if namespace != args.namespace:
+        log_name = f"{namespace}_{log_name}"
+    logger = ConversationLogger(os.path.join(args.save_path, log_name))
+    try:
+        _, try_time = remediate(
+            runtime_envs="This microservice system runs on k3s.",
+            namespace=namespace,
+            root_cause=target_pod,
+            failure_category=failure_type,
+            remediate_method=args.remediate_method,
+            logger=logger
+        )
+    except BaseException:
+        logger.close(final_status="aborted")
+        raise
+    elapsed_time = time.time() - start_time_remediation
+
+    # Check final status
+    success = check_status.check(
+        namespace=namespace,
+        label=f"app={target_pod}",
+        type=failure_type
+    )
+
+    # Finish the conversation log with the experiment outcome
+    logger.close(
+        final_status="success" if success else "failed",
+        retries=try_time,
+        remediation_time=elapsed_time
+    )
+    # Token usage was accumulated as the conversation was logged
+    token_count = logger.token_count
+    print(f"[RESULT] Experiment {experiment_no}: success={success}, attempts={try_time}, "
+          f"elapsed={elapsed_time:.2f}s, tokens≈{token_count}")
+
+    # Stop the chaos experiment
+    stop_injection(failure_type, namespace)
+
+    # Restore the environment to its original state
+    print("[INFO] Restoring system to original configuration...")
+    if restore_by_original_manifest(namespace, target_pod, args.manifest_path):
+        _last_restored = (namespace, target_pod, time.monotonic())
+    time.sleep(5)
+
+    return {
+        "outcome": "remediated",
+        "failure_type": failure_type,
+        "success": success,
+        "try_time": try_time,
+        "token_count": token_count,
+        "elapsed_time": elapsed_time,
     }
-    with open(save_path, 'w', encoding='utf-8') as f:
-        json.dump(full_log, f, ensure_ascii=False, indent=2)
-    print(f"✅ Conversation log saved to: {save_path}")
 
 
-def estimate_token_count(conversations: list) -> int:
+# Namespace owned by this worker process (parallel runs only)
+_worker_namespace = None
+
+
+def _init_worker(args, worker_ids):
     """
-    Roughly estimate the number of tokens in the conversation.
-    Approximation: 1 token ≈ 4 characters.
+    ProcessPoolExecutor initializer: set up the run configuration and manifest index and
+    claim a worker id so each process keeps its own namespace for its whole lifetime.
+    The parent has already deployed the environment into every worker namespace, because
+    an initializer that fails would break the whole pool instead of reporting the error.
     """
-    total_chars = sum(len(json.dumps(msg, ensure_ascii=False)) for msg in conversations)
-    return total_chars // 4
+    global _worker_namespace, _last_deploy_at
+    set_config(args)
+    load_original_resources(args.manifest_path)
+    _worker_namespace = f"{args.namespace}-{worker_ids.get()}"
+    _last_deploy_at = time.monotonic()
+
+
+def _run_in_worker(experiment_no: int, failure_type: str, target_pod: str, args) -> dict:
+    return _run_one_experiment(experiment_no, failure_type, target_pod, _worker_namespace, args)
+
+
+def _iter_failures(path: str):
+    """Yield the failure types listed in an experiment file, skipping blank lines and '#' comments."""
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
 
 
 def run_experiments(args):
     """
     Conduct automated failure injection and remediation experiments.
+    With --parallel N > 1, experiments run in N worker processes, each bound to its own
+    namespace '<namespace>-<worker id>' holding a separate copy of the environment.
     """
 
     success_count = 0
@@ -48,7 +271,6 @@ def run_experiments(args):
     total_remediation_time = 0
     success_token_count = 0
     success_remediation_time = 0
-    current_experiment_no = 1
     failure_injection_failures = 0
     failure_type_success_remediation_dict = {}
     failure_type_success_injection_dict = {}
@@ -59,128 +281,98 @@ def run_experiments(args):
     target_env = args.env or "default-env"
     print(f"[INFO] Target environment: {target_env}")
 
-    # === Load failure list from experiment file (if provided) ===
+    # === Stream failure types from experiment file (if provided) ===
+    failures = None
     if args.experiment_path and os.path.exists(args.experiment_path):
-        with open(args.experiment_path, "r") as f:
-            failure_list = [
-                line.strip() for line in f.readlines()
-                if line.strip() and not line.strip().startswith("#")
-            ]
-        print(f"[INFO] Loaded {len(failure_list)} failure types from {args.experiment_path}")
-    else:
-        failure_list = None
+        # A quick counting pass; the experiments themselves consume the file lazily
+        failure_count = sum(1 for _ in _iter_failures(args.experiment_path))
+        print(f"[INFO] Loaded {failure_count} failure types from {args.experiment_path}")
+        if failure_count:
+            failures = _iter_failures(args.experiment_path)
 
     # Determine experiment count
-    total_experiments = len(failure_list) if failure_list else args.experiments
+    total_experiments = failure_count if failures else args.experiments
     print(f"[INFO] Total experiments to execute: {total_experiments}")
 
-    while current_experiment_no <= total_experiments:
-        print(f"\n=== Experiment {current_experiment_no} / {total_experiments} ===")
-
-        # Select failure type
-        if failure_list:
-            failure_type = failure_list[current_experiment_no - 1]
-        else:
+    def draw(retry_of=None):
+        """
+        Select the failure type and target pod of an experiment.
+        A restarted experiment from the experiment file keeps its failure type (retry_of).
+        """
+        if failures is None:
             failure_type = get_random_failure(target_env)
-        target_pod = get_random_service(target_env, failure_type)
-        print(f"[INFO] Injecting failure '{failure_type}' on target pod '{target_pod}'")
-
-        if not check_status.check(args.namespace, f"app={target_pod}", "pod-fail"):
-            print(f"[INFO] Unable to get a health service, restarting whole system...")
-            deploy_env(target_env)
-            continue
-
-        injection_status = inject_failure(failure_type, target_pod, args.namespace)
-        if not injection_status:
-            failure_injection_failures += 1
-            current_experiment_no += 1
-            continue
-
-        print(f"[INFO] Chaos YAML applied successfully. Monitoring injection status...")
-
-        # Wait for chaos injection to take effect
-        start_time_injection = time.time()
-        injected = False
-        while True:
-            if time.time() - start_time_injection > args.injection_timeout:
-                print(f"[WARN] Injection timeout for {failure_type} on {target_pod}")
-                if args.enable_strict_restart:
-                    print(f"[INFO] In strict restart mode, restarting whole system...")
-                    deploy_env(target_env)
-                    continue
-                break
-            if not check_status.check(args.namespace, f"app={target_pod}", failure_type, 5):
-                injected = True
-                break
-            time.sleep(args.wait_interval)
-
-        if not injected:
-            # Stop the chaos experiment
-            stop_injection(failure_type, args.namespace)
-
+        elif retry_of is not None:
+            failure_type = retry_of
+        else:
+            failure_type = next(failures)
+        return failure_type, get_random_service(target_env, failure_type)
+
+    def collect(result):
+        nonlocal success_count, total_remediation_tries, total_token_count, total_remediation_time
+        nonlocal success_token_count, success_remediation_time, failure_injection_failures
+        failure_type = result["failure_type"]
+        if result["outcome"] == "injection_failed":
             failure_injection_failures += 1
-            current_experiment_no += 1
-            continue
-
-        print(f"[INFO] Failure '{failure_type}' on '{target_pod}' successfully injected.")
+            return
         failure_type_success_injection_dict[failure_type] = failure_type_success_injection_dict.get(failure_type, 0) + 1
-
-        # Start remediation process
-        print("[INFO] Initiating failure remediation sequence...")
-        start_time_remediation = time.time()
-        conversations, try_time = remediate(
-            runtime_envs="This microservice system runs on k3s.",
-            namespace=args.namespace,
-            root_cause=target_pod,
-            failure_category=failure_type,
-            remediate_method=args.remediate_method
-        )
-        elapsed_time = time.time() - start_time_remediation
-
-        # Estimate token usage from conversation
-        token_count = estimate_token_count(conversations)
-        total_token_count += token_count
-        total_remediation_time += elapsed_time
-
-        # Check final status
-        success = check_status.check(
-            namespace=args.namespace,
-            label=f"app={target_pod}",
-            type=failure_type
-        )
-
-        full_log_path = os.path.join(args.save_path, f"{target_pod}_{failure_type}_{int(time.time())}.json")
-        # Save conversation log
-        _save_conversation(
-            full_log_path,
-            conversations,
-            final_status="success" if success else "failed",
-            retries=try_time,
-            token_count=token_count,
-            remediation_time=elapsed_time
-        )
-        print(f"[INFO] Conversation log saved to: {full_log_path}")
-        print(f"[RESULT] Experiment {current_experiment_no}: success={success}, attempts={try_time}, "
-              f"elapsed={elapsed_time:.2f}s, tokens≈{token_count}")
-
-        if success:
+        total_token_count += result["token_count"]
+        total_remediation_time += result["elapsed_time"]
+        if result["success"]:
             success_count += 1
-            total_remediation_tries += try_time
-            success_token_count += token_count
-            success_remediation_time += elapsed_time
+            total_remediation_tries += result["try_time"]
+            success_token_count += result["token_count"]
+            success_remediation_time += result["elapsed_time"]
             failure_type_success_remediation_dict[failure_type] = failure_type_success_remediation_dict.get(
                 failure_type,
                 0) + 1
 
-        # Stop the chaos experiment
-        stop_injection(failure_type, args.namespace)
-
-        # Restore the environment to its original state
-        print("[INFO] Restoring system to original configuration...")
-        restore_by_original_manifest(args.namespace, target_pod, args.manifest_path)
-        time.sleep(5)
-
-        current_experiment_no += 1
+    if args.parallel <= 1:
+        current_experiment_no = 1
+        retry_of = None
+        while current_experiment_no <= total_experiments:
+            print(f"\n=== Experiment {current_experiment_no} / {total_experiments} ===")
+            failure_type, target_pod = draw(retry_of)
+            result = _run_one_experiment(current_experiment_no, failure_type, target_pod, args.namespace, args)
+            if result["outcome"] == "restart":
+                retry_of = failure_type
+                continue
+            retry_of = None
+            collect(result)
+            current_experiment_no += 1
+    else:
+        worker_ids = multiprocessing.Queue()
+        for worker_id in range(args.parallel):
+            worker_ids.put(worker_id)
+        print(f"[INFO] Running {args.parallel} experiments in parallel in namespaces "
+              f"{args.namespace}-0 .. {args.namespace}-{args.parallel - 1}")
+        # Deploy every worker namespace up front; a failure stops the run here with its reason
+        with ThreadPoolExecutor(max_workers=args.parallel) as deployer:
+            list(deployer.map(lambda worker_id: deploy_env(target_env, f"{args.namespace}-{worker_id}"),
+                              range(args.parallel)))
+        with ProcessPoolExecutor(max_workers=args.parallel, initializer=_init_worker,
+                                 initargs=(args, worker_ids)) as executor:
+            def submit(experiment_no, retry_of=None):
+                future = executor.submit(_run_in_worker, experiment_no, *draw(retry_of), args)
+                pending[future] = experiment_no
+
+            pending = {}
+            for experiment_no in range(1, total_experiments + 1):
+                submit(experiment_no)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    experiment_no = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        # e.g. a worker could not redeploy its namespace: stop scheduling new experiments
+                        executor.shutdown(cancel_futures=True)
+                        raise
+                    if result["outcome"] == "restart":
+                        # The environment was redeployed; draw this experiment again
+                        submit(experiment_no, result["failure_type"])
+                    else:
+                        collect(result)
 
     # Summary
     print("\n" + "=" * 60)
@@ -219,8 +411,9 @@ if __name__ == "__main__":
     parser.add_argument("--injection-timeout", type=int, default=30, help="Timeout (seconds) for failure injection.")
     parser.add_argument("--env", type=str, default="train-ticket", help="Target environment identifier.")
     parser.add_argument("--save-path", type=str, default="conversations", help="Directory to store conversation logs.")
-    parser.add_argument("--manifest-path", type=str, default="envs/source-config/train-ticket-config.yaml",
-                        help="Path to original service config for restoration.")
+    parser.add_argument("--manifest-path", type=str,
+                        default=os.environ.get(MANIFEST_ENV_VAR, "envs/source-config/train-ticket-config.yaml"),
+                        help=f"Path to original service config for restoration (default: ${MANIFEST_ENV_VAR}).")
     parser.add_argument("--remediate-method", type=str, default="ThinkRemed",
                         help="Remediation method to use: ThinkRemed / SoloGen")
     parser.add_argument("--experiment-path", type=str, default=None,
@@ -229,7 +422,16 @@ if __name__ == "__main__":
                         help="Restart to try in every injection timeout.")
     parser.add_argument("--model", type=str, default="",
                         help="Applied LLM backbone.")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="Number of experiments run concurrently; worker i deploys the environment into namespace '<namespace>-<i>'.")
 
     args = parser.parse_args()
     set_config(args)
-    run_experiments(args)
+    # Parse the original manifest once up front; workers find it through the environment
+    os.environ[MANIFEST_ENV_VAR] = args.manifest_path
+    load_original_resources(args.manifest_path)
+    try:
+        run_experiments(args)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -1,17 +1,23 @@
 import json
-import time
 
+from chaos.check_status import wait_until_healthy
 from methods.SoloGen.tools import print_playbook_function
-from methods.execution_agent import execute_playbook_and_get_response
+from methods.execution_agent import execute_playbook_and_get_response, load_inventory
 from models.llm import chat_api
 
-# Time to wait after remediation execution before verification (in seconds)
+try:
+    # orjson parses large tool arguments (whole playbooks) several times faster than the stdlib
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+# Maximum time to wait for the remediation to take effect before verification (in seconds)
 WAIT_REME_TIME = 10
 # Maximum number of retries allowed for remediation attempts (currently unused but reserved)
 MAX_RETRY_TIME = 3
 
 
-def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
+def remediate_failure(runtime_envs, namespace, root_cause, failure_category, logger=None):
     """
     Generates and executes an Ansible playbook to remediate a diagnosed failure in a Kubernetes-based microservice environment.
 
@@ -20,6 +26,7 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
         namespace (str): Kubernetes namespace where the failure occurred.
         root_cause (str): The service or component identified as the root cause.
         failure_category (str): High-level category of the failure (e.g., "latency", "error_rate", "resource_exhaustion").
+        logger (ConversationLogger, optional): Receives every message as it is added to the conversation.
 
     Returns:
         tuple: (prompts history, number of remediation attempts made)
@@ -28,8 +35,7 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
     print(f"Start to remediate root cause: {root_cause}, failure category: {failure_category}")
 
     # Load the Ansible inventory file content to provide context for playbook generation
-    with open("inventory.ini", "r") as fr:
-        inventory_content = fr.read()
+    inventory_content = load_inventory()
 
     # Construct the initial system prompt with contextual information for the LLM
     root_prompt = f'''You are an experienced SRE managing a microservice system.
@@ -41,7 +47,15 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
     The current namespace is: {namespace}, failure root cause service is: {root_cause}, and the failure category is: {failure_category}.'''
 
     # Initialize conversation history with the system prompt
-    prompts = [{"role": "system", "content": root_prompt}]
+    prompts = []
+
+    def record(message):
+        """Add a message to the conversation and stream it to the logger, if any."""
+        prompts.append(message)
+        if logger is not None:
+            logger.append(message)
+
+    record({"role": "system", "content": root_prompt})
 
     # Invoke the LLM with a function-calling tool to generate the playbook
     _, tools = chat_api(prompts, tools=[print_playbook_function])
@@ -52,21 +66,21 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
         try:
             # Append the LLM's raw tool arguments to the conversation history for traceability
             tool_arguments_str = tools[0]["function"]["arguments"]
-            prompts.append({"role": "assistant", "content": tool_arguments_str})
+            record({"role": "assistant", "content": tool_arguments_str})
             print(tool_arguments_str)
 
             # Parse the JSON-formatted arguments and extract the playbook code
-            playbook_code = json.loads(tool_arguments_str)["code"]
+            playbook_code = json_loads(tool_arguments_str)["code"]
         except (json.JSONDecodeError, KeyError, TypeError):
             # Handle malformed or unexpected tool response
-            prompts.append({"role": "assistant", "content": "Error Code"})
+            record({"role": "assistant", "content": "Error Code"})
             playbook_code = ""
 
     # Execute the generated Ansible playbook in the target environment
     execute_playbook_and_get_response(playbook_code)
 
-    # Allow time for the remediation to take effect before verification
-    time.sleep(WAIT_REME_TIME)
+    # Allow time for the remediation to take effect, returning early once the service is healthy
+    wait_until_healthy(namespace, f"app={root_cause}", failure_category, WAIT_REME_TIME)
 
     # Return the full prompt history and the count of remediation attempts (currently always 1)
     return prompts, 1
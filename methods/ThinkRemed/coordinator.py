@@ -1,20 +1,25 @@
 import json
-import time
 import traceback
 
-from methods.execution_agent import execute_playbook_and_get_response
-from methods.ThinkRemed.probe_agent import get_probe_response
+from methods.execution_agent import execute_playbook_and_get_response, load_inventory
+from methods.ThinkRemed.probe_agent import run_probes, split_probe_commands
 from methods.ThinkRemed.tools import print_playbook_function, probe_function
-from methods.ThinkRemed.verification_agent import verify_status
+from methods.ThinkRemed.verification_agent import wait_until_verified
 from models.llm import chat_api
 
-# Time to wait (in seconds) after playbook execution before verifying remediation success
+try:
+    # orjson parses large tool arguments (whole playbooks) several times faster than the stdlib
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+# Maximum time (in seconds) to wait for the failure to clear after playbook execution
 WAIT_REME_TIME = 10
 # Maximum number of remediation retries allowed (0 means no retries)
 MAX_RETRY_TIME = 1
 
 
-def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
+def remediate_failure(runtime_envs, namespace, root_cause, failure_category, logger=None):
     """
     Orchestrates an LLM-driven remediation process using the ThinkRemed framework.
     The agent may iteratively probe the system state and refine its Ansible playbook until the failure is resolved or retries are exhausted.
@@ -24,6 +29,7 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
         namespace (str): Kubernetes namespace of the affected service.
         root_cause (str): Name of the service identified as the root cause.
         failure_category (str): Type of failure (e.g., "latency", "error_rate", "pod_crash").
+        logger (ConversationLogger, optional): Receives every message as it is added to the conversation.
 
     Returns:
         tuple: (conversation history as list of message dicts, number of remediation attempts made)
@@ -32,8 +38,7 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
     print(f"Start to remediate root cause: {root_cause}, failure category: {failure_category}")
 
     # Load Ansible inventory to provide infrastructure context to the LLM
-    with open("inventory.ini", "r") as fr:
-        inventory_content = fr.read()
+    inventory_content = load_inventory()
 
     # Construct the initial system prompt with environment and task context
     root_prompt = f'''You are an experienced SRE managing a microservice system.
@@ -45,7 +50,26 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
     The current namespace is: {namespace}, failure root cause service is: {root_cause}, and the failure category is: {failure_category}.'''
 
     # Initialize the conversation history with the system role
-    prompts = [{"role": "system", "content": root_prompt}]
+    prompts = []
+
+    def record(message):
+        """Add a message to the conversation and stream it to the logger, if any."""
+        prompts.append(message)
+        if logger is not None:
+            logger.append(message)
+
+    record({"role": "system", "content": root_prompt})
+
+    # Probe outputs seen since the last playbook execution, keyed by the stripped command
+    probe_cache = {}
+
+    def probe(cmds):
+        """Run probe commands, reusing outputs of identical commands already run in this round."""
+        cmd_list = split_probe_commands(cmds)
+        misses = list(dict.fromkeys(cmd for cmd in cmd_list if cmd.strip() not in probe_cache))
+        for cmd, output in zip(misses, run_probes(misses)):
+            probe_cache[cmd.strip()] = output
+        return "".join(probe_cache[cmd.strip()] for cmd in cmd_list)
 
     def get_playbook_with_probing():
         """
@@ -67,12 +91,12 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
                     tool_args_str = tools[0]["function"]["arguments"]
                     print(tool_args_str)
                     # Append raw tool output to conversation for auditability
-                    prompts.append({"role": "assistant", "content": tool_args_str})
+                    record({"role": "assistant", "content": tool_args_str})
                     # Extract the YAML playbook code from structured JSON arguments
-                    return json.loads(tool_args_str)["code"]
+                    return json_loads(tool_args_str)["code"]
                 except (json.JSONDecodeError, KeyError, TypeError):
                     # Handle malformed or incomplete tool response
-                    prompts.append({"role": "assistant", "content": "Error Code"})
+                    record({"role": "assistant", "content": "Error Code"})
                     return ""
 
             # Case 2: LLM requests one or more probes to gather system state
@@ -80,15 +104,15 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
                 print("think:" + str(tool))
                 try:
                     # Parse the requested probe commands
-                    probe_commands = json.loads(tool["function"]["arguments"])["cmds"]
+                    probe_commands = json_loads(tool["function"]["arguments"])["cmds"]
                     # Execute the probe and retrieve real-time system feedback
-                    tool_result = get_probe_response(probe_commands)
+                    tool_result = probe(probe_commands)
                     # Record the probe result as an assistant message (function output)
-                    prompts.append({"role": "assistant", "content": tool_result})
+                    record({"role": "assistant", "content": tool_result})
 
                     # Prompt the LLM to continue toward playbook generation
                     round_prompt = '''Please continue to generate executable Ansible playbook or get more information from the probe agent.'''
-                    prompts.append({"role": "user", "content": round_prompt})
+                    record({"role": "user", "content": round_prompt})
                 except Exception:
                     # Silently skip malformed probe requests to avoid breaking the loop
                     pass
@@ -109,14 +133,16 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
         Executes the generated Ansible playbook and verifies whether the failure condition is resolved.
         """
         status, output = execute_playbook_and_get_response(playbook_code)
+        # The playbook may have changed the system, so earlier probe outputs are stale
+        probe_cache.clear()
         if status:
-            # Allow time for system to stabilize after remediation
-            time.sleep(WAIT_REME_TIME)
-            # Verify service health based on failure category and root cause label
-            verify_status_result = verify_status(
+            # Verify service health based on failure category and root cause label,
+            # returning as soon as it holds instead of always sleeping WAIT_REME_TIME
+            verify_status_result = wait_until_verified(
                 namespace=namespace,
                 label=f"app={root_cause}",
-                type=failure_category
+                type=failure_category,
+                timeout=WAIT_REME_TIME
             )
             return status, verify_status_result, output
         return status, False, output
@@ -125,7 +151,7 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
     playbook_exec_status, status, output = execute_and_verify()
 
     # Log the execution outcome in the conversation history
-    prompts.append({"role": "assistant", "content": f"playbook execution response: {output}"})
+    record({"role": "assistant", "content": f"playbook execution response: {output}"})
 
     # Retry loop: attempt remediation again if verification failed and retries remain
     try_time = 1
@@ -134,7 +160,7 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
         retry_prompt = f'''The failure of online service has not yet been remediated.
         You may use the probe agent to further inspect the system state and generate a new Ansible playbook to attempt remediation again.
         The previous playbook execution returned: {playbook_exec_status}, output: {status}'''
-        prompts.append({"role": "user", "content": retry_prompt})
+        record({"role": "user", "content": retry_prompt})
 
         try:
             playbook_code = get_playbook_with_probing()
@@ -147,7 +173,7 @@ def remediate_failure(runtime_envs, namespace, root_cause, failure_category):
         try_time += 1
 
         # Record the latest execution result
-        prompts.append({"role": "assistant", "content": f"playbook execution response: {output}"})
+        record({"role": "assistant", "content": f"playbook execution response: {output}"})
 
     # Return full interaction trace and number of attempts made
     return prompts, try_time
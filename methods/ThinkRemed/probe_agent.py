@@ -1,6 +1,200 @@
+import shlex
 import subprocess
 import sys
-from typing import Union, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, List, Optional
+
+from kubernetes import config
+
+from chaos.check_status import KUBECONFIG_PATH, get_core_api
+
+# Upper bound on probe commands run at once
+MAX_PROBE_WORKERS = 8
+# Characters that need a real shell (pipes, redirections, substitutions, chaining, globs, expansions)
+_SHELL_CHARS = set("|&><$`()*?[]{}~!#\\\n")
+# Builtins and keywords have no executable (or behave differently as one), so they need a shell too
+_SHELL_BUILTINS = frozenset({
+    ".", ":", "[", "alias", "case", "cd", "declare", "eval", "exec", "exit", "export", "for",
+    "function", "if", "local", "popd", "pushd", "read", "set", "shift", "source", "test", "trap",
+    "type", "ulimit", "umask", "unset", "until", "wait", "while"
+})
+
+
+def _context_namespace() -> str:
+    """
+    The namespace used when no -n is given: that of the active context in the same kubeconfig
+    get_core_api() loads, so the default namespace and the API server always belong together.
+    """
+    try:
+        return config.list_kube_config_contexts(config_file=KUBECONFIG_PATH)[1]["context"].get("namespace", "default")
+    except Exception:
+        return "default"
+
+
+class K8sProbeBackend:
+    """
+    Serves 'kubectl logs' probes through the in-process kubernetes client instead of spawning kubectl.
+    Only invocations whose output it reproduces exactly are handled (the raw log body); any other
+    command, flag, or API error returns None so that the real kubectl runs and reports it.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._api = get_core_api()
+        self._namespace = _context_namespace()
+
+    @classmethod
+    def get(cls) -> "K8sProbeBackend":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def run(self, cmd: str) -> Optional[subprocess.CompletedProcess]:
+        argv = _plain_argv(cmd)
+        if argv is None or len(argv) < 2 or argv[0] != "kubectl" or argv[1] != "logs":
+            return None
+
+        args = self._parse_flags(argv[2:])
+        if args is None:
+            return None
+        positional, flags = args
+        # Pod names only (not "deploy/x"), and a non-negative --tail (kubectl's -1 means "all")
+        if len(positional) != 1 or "/" in positional[0]:
+            return None
+        tail = flags.get("tail")
+        if tail is not None and not tail.isdigit():
+            return None
+
+        try:
+            stdout = self._logs(positional[0], flags.get("namespace", self._namespace),
+                                flags.get("container"), tail)
+        except Exception:
+            # e.g. a multi-container Pod without -c (kubectl picks the default container) or a missing Pod
+            return None
+        return subprocess.CompletedProcess(cmd, 0, stdout, "")
+
+    @staticmethod
+    def _parse_flags(tokens):
+        """Split kubectl arguments into positionals and the few flags the backend understands."""
+        names = {
+            "-n": "namespace", "--namespace": "namespace",
+            "-c": "container", "--container": "container",
+            "--tail": "tail",
+        }
+        positional, flags = [], {}
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if "=" in token and token.split("=", 1)[0] in names:
+                name, value = token.split("=", 1)
+                flags[names[name]] = value
+            elif token in names and i + 1 < len(tokens):
+                flags[names[token]] = tokens[i + 1]
+                i += 1
+            elif token.startswith("-"):
+                return None
+            else:
+                positional.append(token)
+            i += 1
+        return positional, flags
+
+    def _logs(self, pod_name, namespace, container, tail) -> str:
+        # Read the raw body instead of letting the client deserialize it
+        resp = self._api.read_namespaced_pod_log(
+            pod_name, namespace, container=container,
+            tail_lines=int(tail) if tail is not None else None,
+            _preload_content=False
+        )
+        return resp.data.decode("utf-8", errors="replace")
+
+
+def _plain_argv(cmd: str) -> Optional[List[str]]:
+    """Split a command into argv when it uses no shell features, else return None."""
+    if _SHELL_CHARS & set(cmd):
+        return None
+    try:
+        argv = shlex.split(cmd)
+    except ValueError:
+        return None
+    # Leading VAR=value assignments and builtins are shell features too
+    if not argv or "=" in argv[0] or argv[0] in _SHELL_BUILTINS:
+        return None
+    return argv
+
+
+def _probe_in_process(cmd: str) -> Optional[subprocess.CompletedProcess]:
+    try:
+        backend = K8sProbeBackend.get()
+    except Exception:
+        # No usable kubeconfig: leave every probe to kubectl
+        return None
+    return backend.run(cmd)
+
+
+def _run_probe(cmd: str, timeout: int, check: bool, verbose: bool) -> str:
+    """Run a single probe command and return its "command:...\nresponse:...\n" section."""
+    if verbose:
+        print(f"Executing command: {cmd}", file=sys.stderr)
+
+    try:
+        # Serve well-known read-only probes in-process; everything else goes through the shell
+        result = _probe_in_process(cmd.strip())
+        if result is None:
+            argv = _plain_argv(cmd)
+            # Plain commands are exec'd directly; pipes, redirections, etc. still go through /bin/sh
+            result = subprocess.run(
+                argv if argv is not None else cmd,
+                shell=argv is None,
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+
+        if result.returncode == 0:
+            output = result.stdout.strip()
+            if verbose:
+                print(f"Command succeeded: return code={result.returncode}", file=sys.stderr)
+            return f"command:{cmd}\nresponse:{output}\n"
+        else:
+            # Construct detailed error message including stdout and stderr
+            error_msg = (
+                f"Command failed (command: {cmd})\n"
+                f"STDOUT:\n{result.stdout.strip()}\n"
+                f"STDERR:\n{result.stderr.strip()}"
+            )
+            if verbose or not check:
+                print(error_msg, file=sys.stderr)
+            if check:
+                raise RuntimeError(error_msg)
+            return f"{error_msg}\n"
+
+    except subprocess.TimeoutExpired:
+        error_msg = f"Command timed out after {timeout} seconds:\n{cmd}"
+        if verbose or not check:
+            print(error_msg, file=sys.stderr)
+        if check:
+            raise  # Re-raise the original TimeoutExpired exception
+        return f"command:{cmd}\nresponse: time out\n"
+
+    except FileNotFoundError as e:
+        error_msg = f"Command not found: {cmd}. Please ensure the executable is installed and in PATH.\nError: {e}"
+        if verbose or not check:
+            print(error_msg, file=sys.stderr)
+        if check:
+            raise
+        return f"command:{cmd}\nresponse: command not found\n"
+
+    except Exception as e:
+        error_msg = f"Unexpected error while executing command: {e}\nCommand: {cmd}"
+        if verbose or not check:
+            print(error_msg, file=sys.stderr)
+        if check:
+            raise
+        return f"command:{cmd}\nresponse: unknown error\n"
 
 
 def get_probe_response(
@@ -17,6 +211,7 @@ def get_probe_response(
                                  or a list of strings (e.g., ["kubectl", "get", "pods"]).
                                  If a string contains semicolons (';'), it will be split into multiple commands.
         timeout (int): Maximum time (in seconds) to wait for each command to complete. Default is 10 seconds.
+                       Multiple commands run concurrently, so the total wait is bounded by the slowest one.
         check (bool): If True, raises an exception on command failure or timeout.
                       If False (default), captures and returns error details as part of the output string.
         verbose (bool): If True, prints debug information (e.g., command being run, success/failure) to stderr.
@@ -32,67 +227,21 @@ def get_probe_response(
         subprocess.TimeoutExpired: If `check=True` and a command exceeds the timeout.
         FileNotFoundError: If `check=True` and the command executable is not found.
     """
-    # Normalize input command(s) into a list of individual commands
-    if isinstance(cmds, str) and ";" in cmds:
-        cmd_list = cmds.split(";")
-    else:
-        cmd_list = [cmds] if isinstance(cmds, str) else cmds
+    return "".join(run_probes(split_probe_commands(cmds), timeout, check, verbose))
 
-    outputs = ""
-    for cmd in cmd_list:
-        if verbose:
-            print(f"Executing command: {cmd}", file=sys.stderr)
-
-        try:
-            # Execute the command using shell=True to support pipes, redirections, etc.
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
 
-            if result.returncode == 0:
-                output = result.stdout.strip()
-                if verbose:
-                    print(f"Command succeeded: return code={result.returncode}", file=sys.stderr)
-                outputs += "command:" + cmd + "\nresponse:" + output + "\n"
-            else:
-                # Construct detailed error message including stdout and stderr
-                error_msg = (
-                    f"Command failed (command: {cmd})\n"
-                    f"STDOUT:\n{result.stdout.strip()}\n"
-                    f"STDERR:\n{result.stderr.strip()}"
-                )
-                if verbose or not check:
-                    print(error_msg, file=sys.stderr)
-                if check:
-                    raise RuntimeError(error_msg)
-                outputs += error_msg + "\n"
-
-        except subprocess.TimeoutExpired:
-            error_msg = f"Command timed out after {timeout} seconds:\n{cmd}"
-            if verbose or not check:
-                print(error_msg, file=sys.stderr)
-            if check:
-                raise  # Re-raise the original TimeoutExpired exception
-            outputs += "command:" + cmd + "\nresponse: time out\n"
+def split_probe_commands(cmds: Union[str, List[str]]) -> List[str]:
+    """Normalize input command(s) into a list of individual commands ("a; b" -> ["a", " b"])."""
+    if isinstance(cmds, str) and ";" in cmds:
+        return cmds.split(";")
+    return [cmds] if isinstance(cmds, str) else list(cmds)
 
-        except FileNotFoundError as e:
-            error_msg = f"Command not found: {cmd}. Please ensure the executable is installed and in PATH.\nError: {e}"
-            if verbose or not check:
-                print(error_msg, file=sys.stderr)
-            if check:
-                raise
-            outputs += "command:" + cmd + "\nresponse: command not found\n"
 
-        except Exception as e:
-            error_msg = f"Unexpected error while executing command: {e}\nCommand: {cmd}"
-            if verbose or not check:
-                print(error_msg, file=sys.stderr)
-            if check:
-                raise
-            outputs += "command:" + cmd + "\nresponse: unknown error\n"
+def run_probes(cmd_list: List[str], timeout: int = 10, check: bool = False, verbose: bool = False) -> List[str]:
+    """Run probe commands and return one output section per command, in order."""
+    if len(cmd_list) <= 1:
+        return [_run_probe(cmd, timeout, check, verbose) for cmd in cmd_list]
 
-    return outputs
\ No newline at end of file
+    # Probes are independent, so run them concurrently and keep the original order in the output
+    with ThreadPoolExecutor(max_workers=min(len(cmd_list), MAX_PROBE_WORKERS)) as executor:
+        return list(executor.map(lambda cmd: _run_probe(cmd, timeout, check, verbose), cmd_list))
\ No newline at end of file
@@ -3,3 +3,11 @@ from chaos import check_status
 
 def verify_status(namespace, label, type):
     return check_status.check(namespace, label, type)
+
+
+def wait_until_verified(namespace, label, type, timeout):
+    """
+    Return True as soon as the failure condition is resolved. If it is not resolved within `timeout`
+    seconds, fall through to the full verify_status check, which allows slow recoveries its whole window.
+    """
+    return check_status.wait_until_healthy(namespace, label, type, timeout) or verify_status(namespace, label, type)
@@ -1,7 +1,75 @@
-import subprocess
+import asyncio
+import atexit
+import logging
+import queue
 import sys
 import os
 import signal
+import tempfile
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+
+INVENTORY_FILE = "inventory.ini"
+# Parallel hosts per playbook run and SSH connect timeout (seconds)
+ANSIBLE_FORKS = 50
+ANSIBLE_CONNECT_TIMEOUT = 30
+# Reuse one multiplexed SSH connection per host and send modules over it (pipelining)
+# instead of opening several connections per task; gather facts only when a play asks for them
+# (and cache them across runs); keep the output short.
+# Variables already set in the caller's environment take precedence.
+ANSIBLE_ENV = {
+    "ANSIBLE_PIPELINING": "True",
+    "ANSIBLE_SSH_ARGS": "-o ControlMaster=auto -o ControlPersist=60s -o PreferredAuthentications=publickey",
+    "ANSIBLE_STRATEGY": "free",
+    "ANSIBLE_GATHERING": "explicit",
+    "ANSIBLE_STDOUT_CALLBACK": "minimal",
+    "ANSIBLE_LOAD_CALLBACK_PLUGINS": "False",
+    "ANSIBLE_DISPLAY_SKIPPED_HOSTS": "False",
+    "ANSIBLE_FACT_CACHING": "jsonfile",
+    "ANSIBLE_FACT_CACHING_CONNECTION": "./.ansible_facts",
+    "ANSIBLE_FACT_CACHING_TIMEOUT": "86400",
+}
+# Only the end of ansible's output is decoded and returned (it is fed back to the LLM)
+OUTPUT_TAIL_BYTES = 64 * 1024
+
+# Progress messages are queued and written to stderr by a listener thread, so concurrent
+# playbook runs do not contend on the stderr lock
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+log.propagate = False
+_log_listener = None
+
+
+def _start_log_listener():
+    """(Re)start the stderr listener; also run in forked children, which do not inherit its thread."""
+    global _log_listener
+    records = queue.SimpleQueue()
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(QueueHandler(records))
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.setFormatter(logging.Formatter("%(message)s"))
+    _log_listener = QueueListener(records, stderr_handler)
+    _log_listener.start()
+
+
+_start_log_listener()
+os.register_at_fork(after_in_child=_start_log_listener)
+atexit.register(lambda: _log_listener.stop())
+
+
+def _read_tail(f, limit: int = OUTPUT_TAIL_BYTES) -> str:
+    """Decode the last `limit` bytes written to a binary output file."""
+    fd = f.fileno()
+    size = os.fstat(fd).st_size
+    return os.pread(fd, limit, max(0, size - limit)).decode("utf-8", "replace").strip()
+
+
+@lru_cache(maxsize=1)
+def load_inventory() -> str:
+    """Return the Ansible inventory content; the file does not change during a run, so it is read once."""
+    with open(INVENTORY_FILE, "r") as fr:
+        return fr.read()
 
 
 def execute_playbook_and_get_response(playbook: str, timeout: int = 300):
@@ -16,70 +84,66 @@ def execute_playbook_and_get_response(playbook: str, timeout: int = 300):
         (bool, str): A tuple where:
             - bool indicates whether the execution was successful.
             - str contains stdout (on success) or detailed error output (on failure).
-
-    Raises:
-        RuntimeError: If file writing or execution fails unexpectedly.
     """
+    return asyncio.run(_execute_playbook(playbook, timeout))
 
-    playbook_file = "remediation.yml"
-    inventory_file = "inventory.ini"
-
-    # Step 1: Write playbook content to a file
-    try:
-        with open(playbook_file, "w") as f:
-            f.write(playbook)
-        print(f"✅ Playbook written to: {playbook_file}", file=sys.stderr)
-    except Exception as e:
-        raise RuntimeError(f"❌ Failed to write playbook file {playbook_file}: {e}")
-
-    # Step 2: Prepare ansible-playbook command
-    cmd = ["ansible-playbook", "-i", inventory_file, playbook_file]
-    print(f"🚀 Executing command: {' '.join(cmd)}", file=sys.stderr)
-
-    try:
-        # Start a new process group so we can kill all child processes if it hangs
-        proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            start_new_session=True  # Important for killing the whole group
-        )
-
-        # Wait for the process to complete with timeout
-        stdout, stderr = proc.communicate(timeout=timeout)
-
-        if proc.returncode == 0:
-            print("✅ Playbook executed successfully.", file=sys.stderr)
-            return True, stdout.strip()
-        else:
+
+async def _execute_playbook(playbook: str, timeout: int):
+    # The playbook is piped to ansible-playbook on stdin instead of being written to a file,
+    # so concurrent runs never share a playbook path
+    playbook_input = playbook.encode()
+    cmd = ["ansible-playbook", "-i", INVENTORY_FILE, f"--forks={ANSIBLE_FORKS}", "-T", str(ANSIBLE_CONNECT_TIMEOUT),
+           "/dev/stdin"]
+    env = {**ANSIBLE_ENV, **os.environ}
+    log.info("🚀 Executing command: %s", " ".join(cmd))
+
+    # ansible writes straight to anonymous temp files; only the tail is read back and decoded
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        try:
+            # Start a new process group so we can kill all child processes if it hangs
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=out,
+                stderr=err,
+                env=env,
+                start_new_session=True  # Important for killing the whole group
+            )
+
+            # Wait for the process to complete with timeout
+            await asyncio.wait_for(proc.communicate(input=playbook_input), timeout=timeout)
+
+            if proc.returncode == 0:
+                log.info("✅ Playbook executed successfully.")
+                return True, _read_tail(out)
+            else:
+                error_msg = (
+                    f"⚠️ Playbook execution failed (exit code {proc.returncode})\n"
+                    f"STDOUT:\n{_read_tail(out)}\n\nSTDERR:\n{_read_tail(err)}"
+                )
+                log.warning(error_msg)
+                return False, error_msg
+
+        except asyncio.TimeoutError:
+            # Kill the entire process group
+            log.warning("⏰ Playbook execution exceeded %ss — force killing...", timeout)
+            try:
+                os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+            except Exception as kill_err:
+                log.warning("⚠️ Failed to terminate process group: %s", kill_err)
+            await proc.wait()
             error_msg = (
-                f"⚠️ Playbook execution failed (exit code {proc.returncode})\n"
-                f"STDOUT:\n{stdout.strip()}\n\nSTDERR:\n{stderr.strip()}"
+                f"⏰ Ansible playbook timed out after {timeout}s.\n"
+                f"Partial STDOUT:\n{_read_tail(out)}\n\nPartial STDERR:\n{_read_tail(err)}"
             )
-            print(error_msg, file=sys.stderr)
             return False, error_msg
 
-    except subprocess.TimeoutExpired:
-        # Kill the entire process group
-        print(f"⏰ Playbook execution exceeded {timeout}s — force killing...", file=sys.stderr)
-        try:
-            os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-        except Exception as kill_err:
-            print(f"⚠️ Failed to terminate process group: {kill_err}", file=sys.stderr)
-        stdout, stderr = proc.communicate()
-        error_msg = (
-            f"⏰ Ansible playbook timed out after {timeout}s.\n"
-            f"Partial STDOUT:\n{stdout.strip()}\n\nPartial STDERR:\n{stderr.strip()}"
-        )
-        return False, error_msg
-
-    except FileNotFoundError:
-        error_msg = "❌ 'ansible-playbook' command not found. Please ensure Ansible is installed and available in PATH."
-        print(error_msg, file=sys.stderr)
-        return False, error_msg
-
-    except Exception as e:
-        error_msg = f"⚠️ Unexpected error during playbook execution: {e}"
-        print(error_msg, file=sys.stderr)
-        return False, error_msg
\ No newline at end of file
+        except FileNotFoundError:
+            error_msg = "❌ 'ansible-playbook' command not found. Please ensure Ansible is installed and available in PATH."
+            log.error(error_msg)
+            return False, error_msg
+
+        except Exception as e:
+            error_msg = f"⚠️ Unexpected error during playbook execution: {e}"
+            log.error(error_msg)
+            return False, error_msg
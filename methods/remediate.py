@@ -2,8 +2,12 @@ import methods.ThinkRemed.coordinator
 import methods.SoloGen.generator
 
 
-def remediate(runtime_envs, namespace, root_cause, failure_category, remediate_method):
+def remediate(runtime_envs, namespace, root_cause, failure_category, remediate_method, logger=None):
+    """
+    Run the chosen remediation method. When a ConversationLogger is given,
+    every conversation message is appended to it as soon as it is produced.
+    """
     if remediate_method == "ThinkRemed":
-        return methods.ThinkRemed.coordinator.remediate_failure(runtime_envs, namespace, root_cause, failure_category)
+        return methods.ThinkRemed.coordinator.remediate_failure(runtime_envs, namespace, root_cause, failure_category, logger)
     elif remediate_method == "SoloGen":
-        return methods.SoloGen.generator.remediate_failure(runtime_envs, namespace, root_cause, failure_category)
+        return methods.SoloGen.generator.remediate_failure(runtime_envs, namespace, root_cause, failure_category, logger)
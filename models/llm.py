@@ -1,15 +1,37 @@
+import atexit
+import re
 from argparse import Namespace
+from functools import lru_cache
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
 from config import get_config, set_config
-from concurrent.futures import ThreadPoolExecutor
 import os
 
 api_key = os.getenv("LLM_API_KEY")
 if not api_key:
     raise ValueError("LLM_API_KEY environment variable is not set!")
 
+
+def _make_http_client() -> httpx.Client:
+    """
+    One keep-alive client shared by every chat_api call, so requests reuse TCP/TLS connections.
+    HTTP/2 is enabled when the optional 'h2' package (httpx[http2]) is installed.
+    """
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    return httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30),
+        timeout=httpx.Timeout(connect=10, read=300, write=10, pool=60)
+    )
+
+
+_HTTP_CLIENT = _make_http_client()
+atexit.register(_HTTP_CLIENT.close)
+
 TOOL_CALL_PROMPT = '''"{prompt_message}\n"
     "You have access to the following tools:\n{tool_text}\n"
     "Use the following format if using a tool:\n"
@@ -20,31 +42,20 @@ TOOL_CALL_PROMPT = '''"{prompt_message}\n"
     "```\n"
 '''
 
+# "Action: <tool>" immediately followed by "Action Input: <json>", as requested by TOOL_CALL_PROMPT
+_TOOL_RE = re.compile(r"^Action:[ \t]*(?P<name>[^\n]+)\n[ \t]*Action Input:[ \t]*(?P<args>[^\n]+)", re.MULTILINE)
+
 
 def get_tool_names(tools):
-    names = []
-    for tool in tools:
-        names.append(tool["function"]["name"])
-    return names
-
-
-def get_tool_from_content(content, tool_names):
-    tools = []
-    lines = content.split("\n")
-    name = None
-    for line in lines:
-        if line.startswith("Action: "):
-            name = line[len("Action: "):]
-        elif line.startswith("Action Input: "):
-            arguments = line[len("Action Input: "):]
-            if name in tool_names:
-                tools.append({
-                    "function": {
-                        "name": name,
-                        "arguments": arguments
-                    }
-                })
-    return tools
+    return [tool["function"]["name"] for tool in tools]
+
+
+def get_tool_from_content(content, tool_names: frozenset):
+    return [
+        {"function": {"name": name, "arguments": arguments}}
+        for name, arguments in _TOOL_RE.findall(content)
+        if name in tool_names
+    ]
 
 
 import warnings
@@ -53,8 +64,64 @@ warnings.filterwarnings("ignore")
 
 import json
 
+try:
+    import orjson
+
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, and both loads accept bytes
+    _loads = orjson.loads
 
-def parse_streamed_response(stream_response):
+    def _dumps_compact(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _loads = json.loads
+
+    def _dumps_compact(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+
+def _parse_response(response) -> dict:
+    """Decode a JSON response body straight from its bytes (orjson when available)."""
+    return _loads(response.content)
+
+
+def _sse_event_data(event: bytes):
+    """Join the raw 'data:' fields of one SSE event (multi-line data is joined with '\n'); None if it has none."""
+    data_lines = []
+    for line in event.split(b"\n"):
+        if line.startswith(b"data:"):
+            value = line[5:]
+            data_lines.append(value[1:] if value.startswith(b" ") else value)
+    if not data_lines:
+        return None
+    return b"\n".join(data_lines)
+
+
+def _iter_sse_data(stream_response, chunk_size: int = 8192):
+    """
+    Yield the raw (bytes) data payload of each complete SSE event in a streamed response.
+    Raw bytes are buffered until the blank line ending an event, so a JSON payload split
+    across network chunks is parsed whole instead of being dropped as malformed.
+    """
+    buf = bytearray()
+    for chunk in stream_response.iter_bytes(chunk_size=chunk_size):
+        # Normalize CRLF line endings; a bare CR never appears inside a JSON payload
+        buf += chunk.replace(b"\r", b"")
+        while True:
+            end = buf.find(b"\n\n")
+            if end < 0:
+                break
+            data = _sse_event_data(bytes(buf[:end]))
+            del buf[:end + 2]
+            if data is not None:
+                yield data
+    # The stream may end without a trailing blank line
+    if buf.strip():
+        data = _sse_event_data(bytes(buf))
+        if data is not None:
+            yield data
+
+
+def parse_streamed_response(stream_response, stop_on_tool_call: bool = False):
     """
     Parses a Server-Sent Events (SSE) streamed response from an LLM API,
     aggregates delta updates, and returns the final assistant message as a dictionary.
@@ -63,7 +130,9 @@ def parse_streamed_response(stream_response):
     reconstructed from incremental chunks in the stream.
 
     Args:
-        stream_response: A streaming response object (e.g., from requests) that yields SSE lines.
+        stream_response: A streaming response object (e.g., from httpx) whose body is an SSE stream.
+        stop_on_tool_call: Close the stream as soon as the tool calls are complete
+            (finish_reason == "tool_calls") instead of reading it to [DONE].
 
     Returns:
         dict: A complete assistant message with the following structure:
@@ -79,58 +148,67 @@ def parse_streamed_response(stream_response):
         "tool_calls": []
     }
 
+    # Streamed text fragments, joined once at the end
+    content_parts = []
     # Temporary storage for tool calls, keyed by their index to support parallel tool invocations
     current_tool_calls = {}
+    # Argument fragments of each tool call, keyed by the same index
+    arguments_parts = {}
 
-    for line in stream_response.iter_lines():
-        if not line:
-            continue
+    for data in _iter_sse_data(stream_response):
+        if data.strip() == b'[DONE]':
+            break
 
-        if line.startswith('data: '):
-            data_str = line[6:]  # Strip the "data: " prefix
-            if data_str.strip() == '[DONE]':
-                break
+        try:
+            chunk = _loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue  # Skip malformed events
 
-            try:
-                chunk = json.loads(data_str)
-            except json.JSONDecodeError:
-                continue  # Skip malformed JSON lines
-
-            # Skip chunks without choices
-            if 'choices' not in chunk or not chunk['choices']:
-                continue
+        # Skip chunks without choices
+        if 'choices' not in chunk or not chunk['choices']:
+            continue
 
-            delta = chunk['choices'][0]['delta']
-
-            # Accumulate content (may be null in tool-use scenarios)
-            if 'content' in delta and delta['content'] is not None:
-                full_message['content'] += delta['content']
-
-            # Process incremental tool_call updates
-            if 'tool_calls' in delta and delta['tool_calls']:
-                for tool_call_chunk in delta['tool_calls']:
-                    index = tool_call_chunk['index']
-
-                    # Initialize a new tool call entry if not already present
-                    if index not in current_tool_calls:
-                        current_tool_calls[index] = {
-                            "id": tool_call_chunk.get("id"),
-                            "type": tool_call_chunk.get("type", "function"),
-                            "function": {
-                                "name": "",
-                                "arguments": ""
-                            }
+        delta = chunk['choices'][0]['delta']
+
+        # Accumulate content (may be null in tool-use scenarios)
+        if 'content' in delta and delta['content'] is not None:
+            content_parts.append(delta['content'])
+
+        # Process incremental tool_call updates
+        if 'tool_calls' in delta and delta['tool_calls']:
+            for tool_call_chunk in delta['tool_calls']:
+                index = tool_call_chunk['index']
+
+                # Initialize a new tool call entry if not already present
+                if index not in current_tool_calls:
+                    current_tool_calls[index] = {
+                        "id": tool_call_chunk.get("id"),
+                        "type": tool_call_chunk.get("type", "function"),
+                        "function": {
+                            "name": "",
+                            "arguments": ""
                         }
-
-                    func = current_tool_calls[index]["function"]
-                    if "function" in tool_call_chunk:
-                        func_chunk = tool_call_chunk["function"]
-                        # Set function name (usually appears in the first chunk)
-                        if "name" in func_chunk and func_chunk["name"]:
-                            func["name"] = func_chunk["name"]
-                        # Append incremental arguments (streamed as JSON fragments)
-                        if "arguments" in func_chunk and func_chunk["arguments"]:
-                            func["arguments"] += func_chunk["arguments"]
+                    }
+                    arguments_parts[index] = []
+
+                func = current_tool_calls[index]["function"]
+                if "function" in tool_call_chunk:
+                    func_chunk = tool_call_chunk["function"]
+                    # Set function name (usually appears in the first chunk)
+                    if "name" in func_chunk and func_chunk["name"]:
+                        func["name"] = func_chunk["name"]
+                    # Append incremental arguments (streamed as JSON fragments)
+                    if "arguments" in func_chunk and func_chunk["arguments"]:
+                        arguments_parts[index].append(func_chunk["arguments"])
+
+        # The caller only needs the tool calls: stop reading and free the connection
+        if stop_on_tool_call and current_tool_calls and chunk['choices'][0].get('finish_reason') == "tool_calls":
+            stream_response.close()
+            break
+
+    full_message['content'] = "".join(content_parts)
+    for index, parts in arguments_parts.items():
+        current_tool_calls[index]["function"]["arguments"] = "".join(parts)
 
     # Convert the indexed tool calls into an ordered list
     if current_tool_calls:
@@ -145,57 +223,59 @@ def parse_streamed_response(stream_response):
     return full_message
 
 
+# Model families, matched as substrings of the model name in this order
+# (qwq/glm before qwen: they share its endpoint but stream their responses)
+_FAMILIES = ("claude", "gpt", "qwq", "glm", "qwen", "Kimi", "llama", "deepseek")
+# Families served by DashScope's OpenAI-compatible API with native tool calling
+_DASHSCOPE_TOOL_FAMILIES = frozenset({"qwen", "qwq", "glm"})
+
+
+@lru_cache(maxsize=64)
+def _family_of(model: str):
+    """Return the family of a model name, or None for locally served models."""
+    return next((family for family in _FAMILIES if family in model), None)
+
+
+# Model family -> chat completions endpoint
+_DASHSCOPE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
+_ENDPOINTS = {
+    "claude": ("https://api.anthropic.com/v1/messages", api_key),
+    "gpt": ("https://api.openai.com/v1/chat/completions", api_key),
+    "qwen": (_DASHSCOPE_URL, api_key),
+    "Kimi": (_DASHSCOPE_URL, api_key),
+    "llama": (_DASHSCOPE_URL, api_key),
+    "deepseek": (_DASHSCOPE_URL, api_key),
+    "glm": (_DASHSCOPE_URL, api_key),
+    "qwq": (_DASHSCOPE_URL, api_key),
+}
+# Locally served models (e.g. vLLM)
+_LOCAL_ENDPOINT = ("http://localhost:8000/v1/chat/completions", "s")
+# api_url -> LLMClient, reused across calls
+_CLIENTS = {}
+
+
 def chat_api(prompts, tools):
     model = get_config().model
-    if "claude" in model:
-        llm_client = LLMClient(
-            api_url="https://api.anthropic.com/v1/messages",
-            api_key=api_key
-        )
-    elif "gpt" in model:
-        llm_client = LLMClient(
-            api_url="https://api.openai.com/v1/chat/completions",
-            api_key=api_key
-        )
-    elif "qwen" in model:
-        llm_client = LLMClient(
-            api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
-            api_key=api_key
-        )
-    elif "Kimi" in model:
-        llm_client = LLMClient(
-            api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
-            api_key=api_key
-        )
-    elif "llama" in model:
-        llm_client = LLMClient(
-            api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
-            api_key=api_key
-        )
-    elif "deepseek" in model:
-        llm_client = LLMClient(
-            api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
-            api_key=api_key
-        )
-    elif "glm" in model:
-        llm_client = LLMClient(
-            api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
-            api_key=api_key
-        )
-    elif "qwq" in model:
-        llm_client = LLMClient(
-            api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
-            api_key=api_key
-        )
-    else:
-        llm_client = LLMClient(
-            api_url="http://localhost:8000/v1/chat/completions",
-            api_key="s"
-        )
+    api_url, key = _ENDPOINTS.get(_family_of(model), _LOCAL_ENDPOINT)
+    llm_client = _CLIENTS.get(api_url)
+    if llm_client is None:
+        llm_client = _CLIENTS.setdefault(api_url, LLMClient(api_url=api_url, api_key=key))
     response = llm_client.generate(prompts, tools)
     return response
 
 
+# Model family -> request options for tool calls;
+# models of other families get the tools described in the prompt instead (TOOL_CALL_PROMPT)
+_QWEN_OPTIONS = {"max_tokens": 1024, "stream": False, "enable_thinking": False}
+_PAYLOAD_TEMPLATES = {
+    "claude": {"max_tokens": 8192, "tool_choice": {"type": "any"}},
+    "gpt": {"tool_choice": "required"},
+    "qwq": {**_QWEN_OPTIONS, "stream": True},
+    "glm": {**_QWEN_OPTIONS, "stream": True},
+    "qwen": _QWEN_OPTIONS,
+}
+
+
 class LLMClient:
     def __init__(self, api_url: str, api_key: str):
         self.api_url = api_url
@@ -204,89 +284,47 @@ class LLMClient:
             "Authorization": f"Bearer {api_key}"
         }
 
-    @retry(
-        stop=stop_after_attempt(1),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        reraise=True
-    )
     def generate(self, prompts: list, tools):
         model = get_config().model
+        names = get_tool_names(tools) if tools else []
         max_retry_time = 1
         retry_time = max_retry_time
+        # The payload does not change between retries
+        family = _family_of(model)
+        if not tools:
+            payload = {"model": model, "messages": prompts, "max_tokens": 8192}
+        elif family in _PAYLOAD_TEMPLATES:
+            payload = {"model": model, "messages": prompts, "tools": tools, **_PAYLOAD_TEMPLATES[family]}
+        else:
+            # No native tool calling: describe the tools in the prompt and parse them from the text
+            prompts[-1]["content"] = TOOL_CALL_PROMPT.format(
+                tool_text=_dumps_compact(tools),
+                tool_names=",".join(names),
+                prompt_message=prompts[-1]["content"])
+            payload = {"model": model, "messages": prompts}
         while retry_time >= 0:
-            if tools:
-                if 'claude' in model:
-                    payload = {
-                        "model": model,
-                        "messages": prompts,
-                        "max_tokens": 8192,
-                        "tools": tools,
-                        "tool_choice": {
-                            "type": "any"
-                        }
-                    }
-                elif 'gpt' in model:
-                    payload = {
-                        "model": model,
-                        "messages": prompts,
-                        "tools": tools,
-                        "tool_choice": "required"
-                    }
-                elif 'qwen' in model or 'qwq' in model or 'glm' in model:
-                    payload = {
-                        "model": model,
-                        "messages": prompts,
-                        "tools": tools,
-                        "max_tokens": 1024,
-                        "stream": False,
-                        "enable_thinking": False
-                    }
-                    if 'qwq' in model or 'glm' in model:
-                        payload["stream"] = True
-                else:
-                    if retry_time == max_retry_time:
-                        prompts[-1]["content"] = TOOL_CALL_PROMPT.format(
-                            tool_text=json.dumps(tools),
-                            tool_names=",".join(get_tool_names(tools)),
-                            prompt_message=prompts[-1]["content"])
-                    payload = {
-                        "model": model,
-                        "messages": prompts
-                    }
-            else:
-                payload = {
-                    "model": model,
-                    "messages": prompts,
-                    "max_tokens": 8192,
-                }
-
-            def _do_request():
-                with httpx.Client() as client:
-                    return client.post(
-                        self.api_url,
-                        headers=self.headers,
-                        json=payload,
-                        timeout=httpx.Timeout(connect=10, read=120, write=10, pool=60)
-                    )
-
+            streaming = payload.get("stream", False)
             try:
-                with ThreadPoolExecutor() as executor:
-                    future = executor.submit(_do_request)
-                    response = future.result(timeout=300)
-                    response.raise_for_status()
+                # The client's read timeout bounds the wait for the (possibly long) completion;
+                # streamed bodies are consumed incrementally by parse_streamed_response
+                request = _HTTP_CLIENT.build_request("POST", self.api_url, headers=self.headers, json=payload)
+                response = _HTTP_CLIENT.send(request, stream=streaming)
+                if streaming and response.is_error:
+                    response.close()
+                response.raise_for_status()
             except Exception as e:
                 print(e)
                 retry_time -= 1
                 continue
-            if 'gpt' in model:
-                return_message = response.json()['data']['response']['choices'][0]['message']
+            if family == 'gpt':
+                return_message = _parse_response(response)['data']['response']['choices'][0]['message']
                 if 'tool_calls' in return_message:
                     return return_message['content'], return_message['tool_calls']
                 retry_time -= 1
                 if retry_time == 0:
                     return "", []
-            elif 'claude' in model:
-                content = response.json()
+            elif family == 'claude':
+                content = _parse_response(response)
                 res_tools = []
                 if content['stop_reason'] == 'tool_use':
                     for tool in content['content']:
@@ -301,24 +339,27 @@ class LLMClient:
                 retry_time -= 1
                 if retry_time == 0:
                     return "", []
-            elif 'qwen' in model or 'qwq' in model or 'glm' in model:
-                if payload["stream"]:
-                    full_message = parse_streamed_response(response)
+            elif family in _DASHSCOPE_TOOL_FAMILIES:
+                if streaming:
+                    try:
+                        full_message = parse_streamed_response(response, stop_on_tool_call=True)
+                    finally:
+                        response.close()
                     if 'tool_calls' in full_message and full_message['tool_calls']:
                         return "", full_message['tool_calls']
                     retry_time -= 1
                     if retry_time == 0:
                         return "", []
                 else:
-                    return_message = response.json()['choices'][0]['message']
+                    return_message = _parse_response(response)['choices'][0]['message']
                     if 'tool_calls' in return_message:
                         return "", return_message['tool_calls']
                     retry_time -= 1
                     if retry_time == 0:
                         return "", []
             else:
-                content = response.json()['choices'][0]['message']['content']
-                res_tools = get_tool_from_content(content, get_tool_names(tools))
+                content = _parse_response(response)['choices'][0]['message']['content']
+                res_tools = get_tool_from_content(content, frozenset(names))
                 if res_tools:
                     return content, res_tools
                 retry_time -= 1